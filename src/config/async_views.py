@@ -0,0 +1,83 @@
+"""
+Native async views.
+
+DRF views are synchronous: under ASGI each request is handed to a worker
+thread. ``AsyncAPIView`` is a plain Django view with async handlers instead.
+It authenticates the JWT of the request itself, reads through the async ORM
+and renders JSON like DRF does, so the async endpoints answer like the sync
+ones. They are read-only.
+"""
+
+from django.http import Http404, HttpResponse
+from django.http.response import HttpResponseBase
+from django.views import View
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+    NotFound,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from users.models import User
+
+
+async def authenticate(request):
+    """Return the active user of the request's JWT, like ``JWTAuthentication``."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = header and authentication.get_raw_token(header)
+    if not raw_token:
+        raise NotAuthenticated()
+    # Checking the signature and the expiry needs no query.
+    token = authentication.get_validated_token(raw_token)
+
+    user = await User.objects.filter(
+        **{api_settings.USER_ID_FIELD: token[api_settings.USER_ID_CLAIM]}
+    ).afirst()
+    if user is None:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if not user.is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+    return user
+
+
+def render(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, content_type="application/json"
+    )
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the async read-only endpoints.
+
+    Handlers run with ``self.request`` wrapped in a DRF ``Request`` (for
+    ``query_params`` and the paginators) and ``self.request.user`` set, and
+    return the data to render. ``APIException`` and ``Http404`` become JSON
+    error responses.
+    """
+
+    http_method_names = ["get"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await authenticate(request)
+            self.request = Request(request)
+            self.request.user = user
+            data = await super().dispatch(self.request, *args, **kwargs)
+        except Http404:
+            return render({"detail": NotFound.default_detail}, NotFound.status_code)
+        except APIException as exc:
+            # Like rest_framework.views.exception_handler().
+            detail = exc.detail
+            if not isinstance(detail, (list, dict)):
+                detail = {"detail": detail}
+            return render(detail, exc.status_code)
+        if isinstance(data, HttpResponseBase):
+            # Streams, or 405 Method Not Allowed.
+            return data
+        return render(data)
@@ -0,0 +1,59 @@
+"""
+Statistics of the database connections of this process.
+
+Each database reports how its connections are handled (``per request``,
+``persistent`` or ``pool``, see the database settings), the counters of its
+connection pool if it has one, and the connections the server has open to it
+by state, from ``pg_stat_activity``.
+"""
+
+from django.db import connections
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+def connection_mode(connection):
+    if connection.settings_dict["OPTIONS"].get("pool"):
+        return "pool"
+    if connection.settings_dict["CONN_MAX_AGE"] != 0:
+        return "persistent"
+    return "per request"
+
+
+def server_connections(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT coalesce(state, 'unknown'), count(*)
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            GROUP BY 1
+            """
+        )
+        return dict(cursor.fetchall())
+
+
+def connection_stats():
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        mode = connection_mode(connection)
+        stats[alias] = {
+            "mode": mode,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "health_checks": connection.settings_dict["CONN_HEALTH_CHECKS"],
+            "server_connections": server_connections(connection),
+        }
+        if mode == "pool":
+            stats[alias]["pool"] = connection.pool.get_stats()
+    return stats
+
+
+class ConnectionStatsView(APIView):
+    """This class reports the database connection statistics of the process."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(connection_stats())
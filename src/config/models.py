@@ -0,0 +1,33 @@
+"""
+Shared model behaviour.
+"""
+
+
+class InPlaceFieldsMixin:
+    """
+    Leave ``in_place_fields`` out of the UPDATE when an existing instance is
+    saved.
+
+    Those columns are maintained with ``UPDATE ... SET x = x + 1`` style
+    queries; writing back the values loaded with the instance would undo the
+    updates made since. New rows are inserted with them as usual, and passing
+    them in ``update_fields`` still writes them.
+    """
+
+    in_place_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.in_place_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
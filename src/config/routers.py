@@ -0,0 +1,128 @@
+"""
+Read replicas with read-your-writes.
+
+``ReplicaRoutingMiddleware`` lets the reads of safe-method requests go to one
+of ``DATABASE_REPLICAS``; everything else reads and writes the default
+database. A client that sent an unsafe request is pinned to the primary for
+``REPLICA_PIN_SECONDS`` so that it sees its own writes despite replication
+lag. Clients are told apart by the user id of their JWT, so that a pin
+outlives token refreshes, or else by their session cookie. Pins live in the
+default cache, which must be shared by all processes for the guarantee to hold
+across them.
+"""
+
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Let the reads in the block go to the replicas."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or not _replica_reads.get()
+            # The cache must not lag behind the writes it is invalidated by.
+            or model._meta.app_label == "django_cache"
+            # An open transaction on the primary may hold unreplicated writes.
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from a replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary.
+        return True
+
+
+def jwt_user_id(request):
+    """Return the user id of the valid JWT ``request`` carries, if any."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = header and authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+    except InvalidToken:
+        return None
+    return token.get(jwt_settings.USER_ID_CLAIM)
+
+
+def pin_key(request):
+    user_id = jwt_user_id(request)
+    if user_id is not None:
+        return f"replicas:pin:user:{user_id}"
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    digest = hashlib.sha256(session_key.encode()).hexdigest()
+    return f"replicas:pin:session:{digest}"
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        key = pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if key is not None:
+                cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+        pinned = key is not None and cache.get(key, False)
+        with replica_reads(not pinned):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        key = pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            if key is not None:
+                await cache.aset(key, True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+        pinned = key is not None and await cache.aget(key, False)
+        with replica_reads(not pinned):
+            return await self.get_response(request)
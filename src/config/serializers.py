@@ -0,0 +1,146 @@
+"""
+Sparse fieldsets and expandable relations for model serializers.
+
+On reads, ``?fields=id,title`` limits a response to the listed fields and
+``?expand=comments`` embeds the relations a serializer declares in
+``Meta.expandable_fields``; relations that are not expanded are left out.
+Nested serializers are addressed with dots, e.g. ``?fields=id,comments.content``.
+
+``select_fields()`` restricts a queryset to what such a serializer reads, so
+unused columns are not fetched and unused relations are not joined.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def split_names(value):
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def top_names(names):
+    return {name.split(".", 1)[0] for name in names}
+
+
+def nested_names(names, prefix):
+    return [name.split(".", 1)[1] for name in names if name.startswith(prefix + ".")]
+
+
+class FlexFieldsMixin:
+    """
+    Honor ``?fields=`` and ``?expand=`` in a model serializer.
+
+    ``Meta.expandable_fields`` maps field names to ``(serializer_class,)`` or
+    ``(serializer_class, kwargs)``. Serializers nested through an expansion
+    receive the dotted parts of both parameters as ``fields`` and ``expand``.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.requested_fields = fields
+        self.requested_expand = expand
+        super().__init__(*args, **kwargs)
+
+    def get_flex_param(self, requested, param):
+        if requested is not None:
+            return requested
+        # Writes are validated against all fields, whatever the query says.
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return []
+        return split_names(request.query_params.get(param))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        sparse = self.get_flex_param(self.requested_fields, "fields")
+        expand = self.get_flex_param(self.requested_expand, "expand")
+
+        expandable = getattr(self.Meta, "expandable_fields", {})
+        for name, (serializer_class, *options) in expandable.items():
+            if name not in top_names(expand) or (
+                sparse and name not in top_names(sparse)
+            ):
+                fields.pop(name, None)
+                continue
+            fields[name] = serializer_class(
+                fields=nested_names(sparse, name),
+                expand=nested_names(expand, name),
+                **(options[0] if options else {}),
+            )
+
+        if sparse:
+            wanted = top_names(sparse)
+            fields = {name: field for name, field in fields.items() if name in wanted}
+        return fields
+
+
+def select_fields(queryset, serializer, prefix="", extra=()):
+    """
+    Restrict ``queryset`` to the columns and relations ``serializer`` reads.
+
+    Model fields are loaded with ``only()``, forward relations the serializer
+    follows are joined with ``select_related()`` and nested serializers of
+    reverse relations are prefetched, restricted the same way. ``prefix`` is
+    the lookup from the queryset's model to the serialized one; ``extra``
+    names more columns to load, e.g. the ones a paginator orders by.
+    """
+    plan = {"only": list(extra), "select": [], "prefetch": [], "complete": True}
+    if prefix:
+        plan["select"].append(prefix)
+    _plan_fields(serializer, prefix, plan)
+
+    queryset = queryset.select_related(*plan["select"]).prefetch_related(
+        *plan["prefetch"]
+    )
+    if plan["complete"]:
+        queryset = queryset.only(*plan["only"])
+    return queryset
+
+
+def _join(*parts):
+    return "__".join(part for part in parts if part)
+
+
+def _plan_fields(serializer, path, plan):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = serializer.Meta.model
+    plan["only"].append(_join(path, model._meta.pk.name))
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if not field.source_attrs:
+            # The field reads the whole object; any column may be needed.
+            plan["complete"] = False
+            continue
+
+        name, *rest = field.source_attrs
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations and prefetched attributes are the view's business.
+            continue
+
+        lookup = _join(path, name)
+        if not model_field.is_relation:
+            plan["only"].append(lookup)
+        elif model_field.concrete and not model_field.many_to_many:
+            plan["only"].append(lookup)
+            if isinstance(field, serializers.BaseSerializer):
+                plan["select"].append(lookup)
+                _plan_fields(field, lookup, plan)
+            elif rest:
+                plan["select"].append(lookup)
+                plan["only"].append(_join(lookup, rest[0]))
+        elif model_field.one_to_many and isinstance(field, serializers.BaseSerializer):
+            related = model_field.related_model._default_manager.all()
+            plan["prefetch"].append(
+                Prefetch(
+                    lookup,
+                    queryset=select_fields(
+                        related, field, extra=[model_field.field.name]
+                    ),
+                )
+            )
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
+from importlib.util import find_spec
 import os
 from datetime import timedelta
 
@@ -48,6 +50,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "users.apps.UsersConfig",
     "posts.apps.PostsConfig",
     "messaging.apps.MessagingConfig",
@@ -80,6 +83,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "config.routers.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -104,6 +108,38 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 
 # Database:
+# Connections are opened per request unless DB_CONN_MAX_AGE keeps them open
+# for that many seconds ("none": without limit) to serve the next requests of
+# the same thread; DB_CONN_HEALTH_CHECKS checks them before they are reused.
+# DB_POOL_MAX_SIZE > 0 shares a pool of up to that many connections among the
+# threads of a process instead, which also works under ASGI. Pooling requires
+# psycopg 3 with the pool extra (``pip install "psycopg[binary,pool]"``);
+# psycopg2 has no pool support, so the settings refuse to load without it.
+# Unless set in the environment or .env, both default to the server that
+# DJANGO_SERVER names (set by config/wsgi.py and config/asgi.py): worker
+# threads of a WSGI server keep their connection for 60 seconds, while under
+# ASGI connections cannot be kept per thread. See config.connections for
+# statistics.
+DJANGO_SERVER = os.environ.get("DJANGO_SERVER")
+conn_max_age = os.environ.get(
+    "DB_CONN_MAX_AGE", "60" if DJANGO_SERVER == "wsgi" else "0"
+)
+conn_health_checks = os.environ.get(
+    "DB_CONN_HEALTH_CHECKS", "true" if DJANGO_SERVER else "false"
+)
+DB_CONN_MAX_AGE = None if conn_max_age.lower() == "none" else int(conn_max_age)
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 0))
+if DB_POOL_MAX_SIZE and not (find_spec("psycopg") and find_spec("psycopg_pool")):
+    raise ImproperlyConfigured(
+        "DB_POOL_MAX_SIZE requires psycopg 3 with the pool extra "
+        '(pip install "psycopg[binary,pool]"); psycopg2 cannot pool connections.'
+    )
+DB_POOL_OPTIONS = {
+    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+    "max_size": DB_POOL_MAX_SIZE,
+    # Seconds a request waits for a free connection.
+    "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+}
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",  # Corrected the ENGINE setting
@@ -112,8 +148,79 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD"),
         "HOST": os.environ.get("DB_HOST"),
         "PORT": os.environ.get("DB_PORT"),
+        # A pool hands connections back after each request by itself.
+        "CONN_MAX_AGE": 0 if DB_POOL_MAX_SIZE else DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": conn_health_checks.lower() in ("1", "true", "yes"),
+        "OPTIONS": {"pool": DB_POOL_OPTIONS} if DB_POOL_MAX_SIZE else {},
+    }
+}
+
+# Read replicas:
+# DB_REPLICA_HOSTS lists read replicas of the default database as "host" or
+# "host:port", comma-separated. Safe-method requests read from them, except for
+# clients that sent a write in the last REPLICA_PIN_SECONDS (see
+# config.routers). In tests, the replicas mirror the default database.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), 1
+):
+    host, _, port = address.strip().partition(":")
+    alias = f"replica{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
     }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["config.routers.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 10))
+
+
+# Cache:
+# CACHE_BACKEND is "locmem" (default, per process, for development), "file"
+# (CACHE_LOCATION is an absolute directory) or "db" (CACHE_LOCATION is a table,
+# create it with `python manage.py createcachetable`).
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "db": "django.core.cache.backends.db.DatabaseCache",
 }
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[os.environ.get("CACHE_BACKEND", "locmem")],
+        "LOCATION": os.environ.get("CACHE_LOCATION", "social_club_cache"),
+    }
+}
+
+# Home timelines:
+# New posts are fanned out to the followers' timelines in a background thread.
+TIMELINE_FANOUT_ASYNC = True
+# Posts of authors with more followers than this are merged into timelines at
+# read time instead (None fans out every post).
+TIMELINE_FANOUT_THRESHOLD = 10_000
+# Number of recent posts cached per high-follower author.
+TIMELINE_RECENT_POSTS = 50
+
+
+# Post archive:
+# Posts without activity for this many days are moved to the archive by the
+# archive_posts command.
+POSTS_ARCHIVE_AFTER_DAYS = int(os.environ.get("POSTS_ARCHIVE_AFTER_DAYS", 365))
+
+
+# Message streams:
+# New messages are pushed to the message streams through MESSAGING_BROKER:
+# "messaging.broker.LocalBroker" within one process, or
+# "messaging.broker.PostgresBroker" across processes over LISTEN/NOTIFY.
+MESSAGING_BROKER = os.environ.get("MESSAGING_BROKER", "messaging.broker.LocalBroker")
+# Seconds between the heartbeats of idle streams.
+MESSAGING_STREAM_HEARTBEAT = 15
+# New message ids buffered per stream; a stream falling further behind catches
+# up from the database instead.
+MESSAGING_STREAM_QUEUE_SIZE = 100
+# Seconds a long poll for new messages waits by default.
+MESSAGING_POLL_TIMEOUT = 25
 
 
 # Password validation
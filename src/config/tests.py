@@ -0,0 +1,228 @@
+import os
+import subprocess
+import sys
+from importlib.util import find_spec
+from unittest import skipIf, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from config.routers import ReplicaRouter, ReplicaRoutingMiddleware, replica_reads
+from posts.models import Post
+from users.models import User
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Test the read replica router and its pins"""
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.read_database)
+
+    def read_database(self, request):
+        return HttpResponse(self.router.db_for_read(Post))
+
+    def send(self, method, token=None, session=None):
+        request = getattr(self.factory, method)("/")
+        if token is not None:
+            request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        if session is not None:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = session
+        return self.middleware(request).content.decode()
+
+    def token_for(self, user_id):
+        return AccessToken.for_user(User(id=user_id))
+
+    def test_router_reads_from_replicas_when_enabled(self):
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), "replica1")
+            self.assertEqual(self.router.db_for_write(Post), DEFAULT_DB_ALIAS)
+
+    def test_writers_are_pinned_to_the_primary(self):
+        token = self.token_for(1)
+        self.assertEqual(self.send("get", token), "replica1")
+        self.assertEqual(self.send("post", token), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.send("get", token), DEFAULT_DB_ALIAS)
+        # The pin holds for the user, also after refreshing the token.
+        self.assertEqual(self.send("get", self.token_for(1)), DEFAULT_DB_ALIAS)
+        # Other clients keep reading from the replicas.
+        self.assertEqual(self.send("get", self.token_for(2)), "replica1")
+        self.assertEqual(self.send("get", "invalid"), "replica1")
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.send("post", self.token_for(3))
+        self.assertEqual(self.send("get", self.token_for(3)), "replica1")
+
+    def test_session_clients_are_pinned_by_session(self):
+        self.assertEqual(self.send("post", session="a"), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.send("get", session="a"), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.send("get", session="b"), "replica1")
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "No read replica is configured.")
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Test read-your-writes against a replica database"""
+
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.writer = self.client_for("writer")
+        self.reader = self.client_for("reader")
+        self.replica = connections[settings.DATABASE_REPLICAS[0]]
+
+    def client_for(self, username):
+        user = User.objects.create_user(
+            username=username, password="testpassword", email=f"{username}@mail.com"
+        )
+        client = APIClient()
+        token = RefreshToken.for_user(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def test_writer_reads_own_post_from_primary(self):
+        url = reverse("posts:post-list")
+        response = self.writer.post(
+            url, {"title": "Mine", "description": "Read your writes"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            response = self.writer.get(url)
+        self.assertEqual(response.data[0]["title"], "Mine")
+        self.assertEqual(len(replica_queries), 0)
+
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            response = self.reader.get(url)
+        self.assertEqual(response.data[0]["title"], "Mine")
+        self.assertGreater(len(replica_queries), 0)
+
+    def test_cached_responses_are_read_from_primary(self):
+        post = Post.objects.create(title="Cached", description="Not stale")
+        url = reverse("posts:post-detail", args=[post.id])
+
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            response = self.reader.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        # Only the version lookup of the conditional GET, which is not cached,
+        # may read the replica.
+        self.assertFalse(
+            [query for query in replica_queries if "title" in query["sql"]]
+        )
+
+
+class ConnectionStatsTests(APITestCase):
+    """Test the database connection statistics"""
+
+    databases = "__all__"
+
+    def test_connection_stats_are_staff_only(self):
+        user = User.objects.create_user(
+            username="testuser1", password="testpassword", email="test@mail.com"
+        )
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("db-connections")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        stats = response.data[DEFAULT_DB_ALIAS]
+        self.assertEqual(stats["mode"], "per request")
+        self.assertGreaterEqual(stats["server_connections"]["active"], 1)
+
+
+POOL_AVAILABLE = bool(find_spec("psycopg") and find_spec("psycopg_pool"))
+
+
+class PoolSettingsTests(SimpleTestCase):
+    """Test the settings of pooled database connections"""
+
+    # The subprocesses connect to the test database.
+    databases = {DEFAULT_DB_ALIAS}
+
+    def run_with_pool(self, code):
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": "config.settings",
+            "DB_POOL_MAX_SIZE": "4",
+            "DB_NAME": connections[DEFAULT_DB_ALIAS].settings_dict["NAME"],
+        }
+        return subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+
+    @skipIf(POOL_AVAILABLE, "psycopg 3 with the pool extra is installed")
+    def test_pool_refuses_to_load_without_psycopg3(self):
+        result = self.run_with_pool("import config.settings")
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("DB_POOL_MAX_SIZE requires psycopg 3", result.stderr)
+
+    @skipUnless(POOL_AVAILABLE, "psycopg 3 with the pool extra is not installed")
+    def test_pool_serves_connections(self):
+        result = self.run_with_pool(
+            "import django; django.setup()\n"
+            "from django.db import connection\n"
+            "from config.connections import connection_mode\n"
+            "connection.ensure_connection()\n"
+            "print(connection.pool.max_size, connection_mode(connection))"
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ["4", "pool"])
+
+
+class ServerSettingsTests(SimpleTestCase):
+    """Test the connection defaults of the WSGI and ASGI servers"""
+
+    def connection_settings(self, server, dotenv=None):
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if key not in ("DB_CONN_MAX_AGE", "DB_CONN_HEALTH_CHECKS", "DJANGO_SERVER")
+        }
+        # Stands in for load_dotenv(), which keeps variables already set.
+        code = (
+            "import os, dotenv\n"
+            "dotenv.load_dotenv = lambda: [os.environ.setdefault(key, value)"
+            f" for key, value in {dotenv or {}!r}.items()]\n"
+            f"import config.{server}\n"
+            "from django.db import connection\n"
+            "print(connection.settings_dict['CONN_MAX_AGE'],"
+            " connection.settings_dict['CONN_HEALTH_CHECKS'])"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout.split()
+
+    def test_servers_pick_their_defaults(self):
+        self.assertEqual(self.connection_settings("wsgi"), ["60", "True"])
+        self.assertEqual(self.connection_settings("asgi"), ["0", "True"])
+
+    def test_dotenv_overrides_server_defaults(self):
+        dotenv = {"DB_CONN_MAX_AGE": "5", "DB_CONN_HEALTH_CHECKS": "false"}
+        self.assertEqual(self.connection_settings("wsgi", dotenv), ["5", "False"])
+        self.assertEqual(self.connection_settings("asgi", dotenv), ["5", "False"])
@@ -1,10 +1,21 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from config.connections import ConnectionStatsView
+from config.export import ExportView
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/users/", include("users.urls", namespace="users")),
     path("api/posts/", include("posts.urls")),
     path("api/messaging/", include("messaging.urls")),
+    path(
+        "api/export/<str:dataset>.<str:extension>", ExportView.as_view(), name="export"
+    ),
+    path(
+        "api/db/connections/",
+        ConnectionStatsView.as_view(),
+        name="db-connections",
+    ),
 ]
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# The settings pick the database connection defaults for the server.
+os.environ.setdefault("DJANGO_SERVER", "wsgi")
 
 application = get_wsgi_application()
@@ -0,0 +1,237 @@
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from config.async_views import AsyncAPIView
+from config.fastpath import RowMapper
+from config.serializers import split_names
+from messaging.broker import communication_channel, get_broker
+from messaging.models import Communication, Message
+from messaging.serializers import MessageSerializer
+from messaging.views import parse_time_bounds
+
+
+def message_mapper(request):
+    serializer = MessageSerializer(
+        fields=split_names(request.query_params.get("fields")), expand=[]
+    )
+    return RowMapper.for_serializer(serializer)
+
+
+async def fetch_and_release(queryset):
+    """Fetch the rows of ``queryset``, then give up the database connection,
+    not to hold it while waiting for new messages."""
+    rows = [row async for row in queryset]
+    await sync_to_async(close_old_connections)()
+    return rows
+
+
+class AsyncMessageList(AsyncAPIView):
+    """This class lists the messages of a communication, like ``MessageList``.
+
+    Supports ``?since=``, ``?until=`` and ``?fields=``.
+    """
+
+    async def get(self, request, communication_id):
+        mapper = message_mapper(request)
+        queryset = (
+            Message.objects.for_user(request.user)
+            .filter(communication_id=communication_id)
+            .filter(**parse_time_bounds(request.query_params))
+            .order_by("created_at", "id")
+        )
+        rows = [row async for row in mapper.values(queryset)]
+        if (
+            not rows
+            and not await Communication.objects.for_user(request.user)
+            .filter(pk=communication_id)
+            .aexists()
+        ):
+            raise PermissionDenied(
+                "You are not allowed to view messages in this communication."
+            )
+        return mapper.map(rows)
+
+
+class AsyncMessageDetail(AsyncAPIView):
+    """This class retrieves a single message, like ``MessageDetail``."""
+
+    async def get(self, request, pk):
+        mapper = message_mapper(request)
+        queryset = mapper.values(Message.objects.for_user(request.user))
+        return mapper(await aget_object_or_404(queryset, pk=pk))
+
+
+class AsyncMessageStream(AsyncAPIView):
+    """This class streams the new messages of a communication as Server-Sent
+    Events, to either participant.
+
+    Each message is a ``message`` event whose id is the message id. A client
+    reconnecting with ``Last-Event-ID`` (or ``?last_event_id=``) first gets
+    the messages it missed. Idle streams get a comment line every
+    ``MESSAGING_STREAM_HEARTBEAT`` seconds. Supports ``?fields=``.
+    """
+
+    # Milliseconds browsers wait before reconnecting.
+    retry = 3000
+    catch_up_batch_size = 500
+
+    async def get(self, request, communication_id):
+        await aget_object_or_404(
+            Communication.objects.for_user(request.user), pk=communication_id
+        )
+        last_id = request.headers.get("Last-Event-ID") or request.query_params.get(
+            "last_event_id"
+        )
+        try:
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            raise ValidationError({"last_event_id": "A valid integer is required."})
+
+        response = StreamingHttpResponse(
+            self.events(communication_id, last_id, message_mapper(request)),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # Keep proxies such as nginx from buffering the stream.
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def events(self, communication_id, last_id, mapper):
+        messages = Message.objects.filter(communication_id=communication_id)
+        subscription = get_broker().subscribe(communication_channel(communication_id))
+        try:
+            yield f"retry: {self.retry}\n\n"
+            if last_id is None:
+                newest = await fetch_and_release(
+                    messages.order_by("-created_at", "-id").values_list(
+                        "id", flat=True
+                    )[:1]
+                )
+                last_id = newest[0] if newest else 0
+            else:
+                subscription.lagging = True
+            # Ids sent lately, so that messages are not sent twice when a
+            # catch-up and the notifications overlap.
+            sent = deque(maxlen=2 * settings.MESSAGING_STREAM_QUEUE_SIZE)
+
+            while True:
+                if subscription.lagging:
+                    subscription.lagging = False
+                    rows = await fetch_and_release(
+                        mapper.values(
+                            messages.filter(id__gt=last_id).order_by("id"), "id"
+                        )[: self.catch_up_batch_size]
+                    )
+                    # Come back for the rest once these are sent.
+                    subscription.lagging = len(rows) == self.catch_up_batch_size
+                else:
+                    try:
+                        message_ids = await subscription.get(
+                            settings.MESSAGING_STREAM_HEARTBEAT
+                        )
+                    except TimeoutError:
+                        yield ": heartbeat\n\n"
+                        continue
+                    message_ids = [id for id in message_ids if id not in sent]
+                    rows = await fetch_and_release(
+                        mapper.values(
+                            messages.filter(id__in=message_ids).order_by("id"), "id"
+                        )
+                    )
+
+                for row in rows:
+                    if row["id"] in sent:
+                        continue
+                    sent.append(row["id"])
+                    last_id = max(last_id, row["id"])
+                    data = JSONRenderer().render(mapper(row)).decode()
+                    yield f"id: {row['id']}\nevent: message\ndata: {data}\n\n"
+        finally:
+            subscription.close()
+
+
+class AsyncMessagePoll(AsyncAPIView):
+    """This class long-polls for the messages of a communication after
+    ``?since_id=<id>``.
+
+    Newer messages, oldest first and at most ``max_messages`` of them, are
+    returned right away. Otherwise the request waits up to ``?timeout=``
+    seconds (``MESSAGING_POLL_TIMEOUT`` by default) for a new message and
+    returns an empty list if none came. Supports ``?fields=``.
+
+    Whether there are newer messages is read from the communication's
+    ``last_message_id``, so an empty poll does not touch the partitioned
+    message table. Messages that arrive while waiting are looked up by
+    ``created_at`` in the newest partition only. Catching up on older
+    messages has no such bound and probes the index of every partition.
+    """
+
+    max_messages = 100
+    max_timeout = 60
+    # How much older than the wait a new message may be stamped: created_at is
+    # set before the message commits, by the clock of the sending process.
+    clock_skew = timedelta(minutes=1)
+
+    async def get(self, request, communication_id):
+        since_id = self.get_int_param("since_id", 0)
+        timeout = min(
+            self.get_int_param("timeout", settings.MESSAGING_POLL_TIMEOUT),
+            self.max_timeout,
+        )
+        mapper = message_mapper(request)
+        messages = Message.objects.filter(
+            communication_id=communication_id, id__gt=since_id
+        ).order_by("id")
+
+        # Subscribe first, not to miss a message sent after the query.
+        subscription = get_broker().subscribe(communication_channel(communication_id))
+        try:
+            communications = await fetch_and_release(
+                Communication.objects.for_user(request.user)
+                .filter(pk=communication_id)
+                .values_list("last_message_id", flat=True)
+            )
+            if not communications:
+                raise PermissionDenied(
+                    "You are not allowed to view messages in this communication."
+                )
+            rows = []
+            if (communications[0] or 0) > since_id:
+                rows = await fetch_and_release(
+                    mapper.values(messages[: self.max_messages])
+                )
+            if rows or not timeout:
+                return mapper.map(rows)
+
+            waited_from = timezone.now()
+            try:
+                await subscription.get(timeout)
+            except TimeoutError:
+                return []
+            recent = messages.filter(created_at__gte=waited_from - self.clock_skew)
+            return mapper.map(
+                await fetch_and_release(mapper.values(recent[: self.max_messages]))
+            )
+        finally:
+            subscription.close()
+
+    def get_int_param(self, name, default):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            value = -1
+        if value < 0:
+            raise ValidationError({name: "A non-negative integer is required."})
+        return value
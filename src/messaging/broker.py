@@ -0,0 +1,191 @@
+"""
+Publish/subscribe for new messages.
+
+New messages are published to the channel of their communication once their
+transaction commits, and the message streams subscribe to it (see
+messaging.async_views). ``MESSAGING_BROKER`` picks the implementation:
+
+- ``LocalBroker`` delivers within the process. It is enough for a single
+  ASGI worker.
+- ``PostgresBroker`` sends the notifications through PostgreSQL
+  ``LISTEN``/``NOTIFY``. Every worker process keeps one listening connection,
+  so no other broker is needed.
+
+Other brokers subclass ``LocalBroker``, publish to the other processes and
+``deliver()`` what they receive.
+
+Subscriptions only receive message ids, in a bounded queue. When a reader
+falls behind and its queue is full, the subscription is marked ``lagging``.
+Its stream then catches up from the database instead of buffering without
+limit.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def communication_channel(communication_id):
+    return f"communication:{communication_id}"
+
+
+class Subscription:
+    def __init__(self, broker, channel, queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagging = False
+
+    def put(self, message_id):
+        """Queue ``message_id``; runs in the subscription's event loop."""
+        try:
+            self.queue.put_nowait(message_id)
+        except asyncio.QueueFull:
+            self.lagging = True
+
+    async def get(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for messages and return the ids queued
+        meanwhile; raises ``TimeoutError`` if none came.
+        """
+        message_ids = [await asyncio.wait_for(self.queue.get(), timeout)]
+        while not self.queue.empty():
+            message_ids.append(self.queue.get_nowait())
+        return message_ids
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, channel):
+        """Subscribe to ``channel``; call it from the event loop reading."""
+        subscription = Subscription(self, channel, settings.MESSAGING_STREAM_QUEUE_SIZE)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def publish(self, channel, message_id):
+        self.deliver(channel, message_id)
+
+    def deliver(self, channel, message_id):
+        """Hand ``message_id`` to the subscriptions of ``channel`` in this
+        process; safe to call from any thread."""
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message_id)
+            except RuntimeError:
+                # The event loop is closed.
+                self.unsubscribe(subscription)
+
+    def mark_lagging(self):
+        """Make every subscription catch up, e.g. after missed notifications."""
+        with self.lock:
+            subscriptions = [s for group in self.subscriptions.values() for s in group]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    setattr, subscription, "lagging", True
+                )
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+
+class PostgresBroker(LocalBroker):
+    channel = "messaging"
+    # Seconds between checks of the listening connection.
+    poll_interval = 5
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+        self.stopping = threading.Event()
+
+    def subscribe(self, channel):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(
+                    target=self.listen, name="messaging-listener", daemon=True
+                )
+                self.listener.start()
+        return super().subscribe(channel)
+
+    def publish(self, channel, message_id):
+        payload = json.dumps({"channel": channel, "message": message_id})
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def stop(self):
+        """Stop listening, within ``poll_interval`` seconds."""
+        self.stopping.set()
+        if self.listener is not None:
+            self.listener.join()
+
+    def listen(self):
+        while not self.stopping.is_set():
+            try:
+                self.listen_once()
+            except Exception:
+                logger.exception("Lost the messaging notification connection.")
+            # Notifications sent while reconnecting are lost.
+            self.mark_lagging()
+            self.stopping.wait(1)
+
+    def listen_once(self):
+        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            for payload in self.notifications(connection.connection):
+                notification = json.loads(payload)
+                self.deliver(notification["channel"], notification["message"])
+        finally:
+            connection.close()
+
+    def notifications(self, raw_connection):
+        """Yield the payloads of the notifications until stopped."""
+        while not self.stopping.is_set():
+            if is_psycopg3:
+                for notify in raw_connection.notifies(timeout=self.poll_interval):
+                    yield notify.payload
+                continue
+
+            readable, _, _ = select.select([raw_connection], [], [], self.poll_interval)
+            if readable:
+                raw_connection.poll()
+                while raw_connection.notifies:
+                    yield raw_connection.notifies.pop(0).payload
+
+
+_brokers = {}
+
+
+def get_broker():
+    """Return the broker of ``MESSAGING_BROKER``, one per process."""
+    path = settings.MESSAGING_BROKER
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
@@ -0,0 +1,71 @@
+"""
+Denormalized last message of communications.
+
+The inbox lists communications with a preview of their newest message, most
+recent activity first. ``Communication.last_message_*`` and
+``last_activity_at`` follow the message signals, so a page of the inbox is a
+single query over the communications instead of a lateral join into the
+partitioned message table per row.
+"""
+
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Greatest
+
+from messaging.models import Communication, Message
+
+PREVIEW_LENGTH = Communication._meta.get_field("last_message_preview").max_length
+
+
+def preview(text):
+    return text[:PREVIEW_LENGTH]
+
+
+def last_message_updates(message):
+    """
+    Return the updates of a communication making ``message`` its last
+    message, unless it already has a newer one.
+    """
+    newer = Q(last_message_id__isnull=True) | Q(last_message_id__lt=message.id)
+    updates = {
+        name: Case(
+            When(newer, then=Value(value)),
+            default=name,
+            output_field=Communication._meta.get_field(name),
+        )
+        for name, value in (
+            ("last_message_id", message.id),
+            ("last_message_preview", preview(message.msg)),
+            ("last_message_at", message.created_at),
+        )
+    }
+    updates["last_activity_at"] = Greatest(
+        "last_activity_at", Value(message.created_at)
+    )
+    return updates
+
+
+def last_message_changed(message):
+    Communication.objects.filter(
+        pk=message.communication_id, last_message_id=message.id
+    ).update(last_message_preview=preview(message.msg))
+
+
+def last_message_removed(message):
+    """Fall back to the previous message if ``message`` was the last one."""
+    communications = Communication.objects.filter(
+        pk=message.communication_id, last_message_id=message.id
+    )
+    if not communications.exists():
+        return
+    previous = (
+        Message.objects.filter(communication_id=message.communication_id)
+        .order_by("-id")
+        .values("id", "msg", "created_at")
+        .first()
+    )
+    # The last activity stays where it is: the message was sent after all.
+    communications.update(
+        last_message_id=previous and previous["id"],
+        last_message_preview=preview(previous["msg"]) if previous else "",
+        last_message_at=previous and previous["created_at"],
+    )
@@ -0,0 +1,131 @@
+import asyncio
+import statistics
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from messaging.models import Communication, Message
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test message polling: many clients poll the message list of a "
+        "communication concurrently, against the sync endpoint served by a "
+        "WSGI server and the async one served by an ASGI server, e.g. "
+        "`gunicorn config.wsgi -w 4 -b 127.0.0.1:8000` and "
+        "`DB_POOL_MAX_SIZE=10 uvicorn config.asgi:application --workers 4 "
+        "--port 8001` (without a pool, every concurrent ASGI request opens a "
+        "connection of its own). The servers must use the same database; the "
+        "test data is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--async-url", default="http://127.0.0.1:8001")
+        parser.add_argument("--clients", type=int, default=100)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds per server."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.5,
+            help="Seconds between the polls of a client.",
+        )
+        parser.add_argument(
+            "--messages", type=int, default=20, help="Messages in the communication."
+        )
+
+    def handle(self, *args, **options):
+        communication = self.build_data(options["messages"])
+        token = str(RefreshToken.for_user(communication.from_user).access_token)
+        try:
+            for name, base_url, view in (
+                ("sync", options["sync_url"], "messaging:message-list"),
+                ("async", options["async_url"], "messaging:async-message-list"),
+            ):
+                url = base_url.rstrip("/") + reverse(view, args=[communication.pk])
+                self.report(name, asyncio.run(self.run(url, token, options)), options)
+        finally:
+            User.objects.filter(
+                pk__in=[communication.from_user_id, communication.to_user_id]
+            ).delete()
+
+    def build_data(self, count):
+        prefix = uuid.uuid4().hex[:8]
+        sender, recipient = User.objects.bulk_create(
+            User(username=f"load-{prefix}-{i}", email=f"load-{prefix}-{i}@invalid")
+            for i in range(2)
+        )
+        communication = Communication.objects.create(
+            from_user=sender, to_user=recipient, status="accepted"
+        )
+        Message.objects.bulk_create(
+            Message(communication=communication, user=sender, msg=f"Message {i}")
+            for i in range(count)
+        )
+        return communication
+
+    async def run(self, url, token, options):
+        results = {"latencies": [], "errors": 0}
+        deadline = time.monotonic() + options["duration"]
+        await asyncio.gather(
+            *(
+                self.poll(url, token, deadline, options["interval"], results)
+                for _ in range(options["clients"])
+            )
+        )
+        return results
+
+    async def poll(self, url, token, deadline, interval, results):
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await self.get(url, token)
+            except OSError:
+                status = None
+            elapsed = time.perf_counter() - start
+            if status == 200:
+                results["latencies"].append(elapsed)
+            else:
+                results["errors"] += 1
+            await asyncio.sleep(max(0, interval - elapsed))
+
+    async def get(self, url, token):
+        """Send a GET request and return the status code of the response."""
+        parts = urlsplit(url)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            writer.write(
+                f"GET {parts.path}?{parts.query} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                f"Authorization: Bearer {token}\r\n"
+                "Connection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        return int(response.split(b" ", 2)[1]) if response else None
+
+    def report(self, name, results, options):
+        latencies = results["latencies"]
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f"  {len(latencies) / options['duration']:,.0f} requests/s, "
+            f"{results['errors']} errors"
+        )
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                "  latency: "
+                + ", ".join(
+                    f"p{p} {percentiles[p - 1] * 1000:.1f} ms" for p in (50, 95, 99)
+                )
+            )
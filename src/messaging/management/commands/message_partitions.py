@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.partitions import detach_old_partitions, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly message partitions of the coming months and "
+        "optionally detach (or drop) the partitions of old months."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Create partitions up to this many months after the current one.",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            default=None,
+            help="Detach the partitions of months before the last N months, "
+            "counting the current one. Detached partitions are kept as plain "
+            "tables for archiving.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop detached partitions instead of keeping them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["retain_months"] is not None and options["retain_months"] < 1:
+            raise CommandError("--retain-months must be at least 1.")
+
+        for name in ensure_partitions(options["months_ahead"]):
+            self.stdout.write(f"Created {name}")
+
+        if options["retain_months"] is not None:
+            for name in detach_old_partitions(
+                options["retain_months"], drop=options["drop"]
+            ):
+                action = "Dropped" if options["drop"] else "Detached"
+                self.stdout.write(f"{action} {name}")
+
+        self.stdout.write(self.style.SUCCESS("Message partitions are up to date."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from messaging.unread import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = "Repair drifted unread message counts of communications."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of communications checked per query.",
+        )
+
+    def handle(self, *args, **options):
+        repaired = sum(reconcile_unread_counts(batch_size=options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} communications."))
@@ -0,0 +1,125 @@
+# Generated by Django 5.1 on 2026-10-18 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+# messaging_message becomes a table partitioned by month of created_at, with
+# one partition per month of existing data up to two months ahead and a
+# default partition for anything else (see messaging.partitions). The rows and
+# their ids are copied over. The partition key has to be part of the primary
+# key, so the primary key becomes (id, created_at); ids still come from a
+# single sequence.
+PARTITION = """
+    -- Check the copied rows right away; indexes cannot be created on tables
+    -- with pending deferred constraint checks.
+    SET CONSTRAINTS ALL IMMEDIATE;
+
+    CREATE TABLE messaging_message_partitioned (
+        id bigint GENERATED BY DEFAULT AS IDENTITY,
+        created_at timestamp with time zone NOT NULL,
+        msg text NOT NULL,
+        communication_id bigint NOT NULL
+            REFERENCES messaging_communication (id) DEFERRABLE INITIALLY DEFERRED,
+        user_id bigint NOT NULL
+            REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED,
+        CONSTRAINT messaging_message_partitioned_pkey PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    CREATE TABLE messaging_message_default
+        PARTITION OF messaging_message_partitioned DEFAULT;
+
+    DO $$
+    DECLARE
+        month timestamp with time zone;
+    BEGIN
+        FOR month IN
+            SELECT generate_series(
+                date_trunc('month', LEAST(min(created_at), now()), 'UTC'),
+                date_trunc('month', now(), 'UTC') + interval '2 months',
+                interval '1 month'
+            )
+            FROM messaging_message
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF messaging_message_partitioned '
+                'FOR VALUES FROM (%L) TO (%L)',
+                'messaging_message_' || to_char(month AT TIME ZONE 'UTC', '"y"YYYY"m"MM'),
+                month,
+                month + interval '1 month'
+            );
+        END LOOP;
+    END $$;
+
+    INSERT INTO messaging_message_partitioned
+        (id, created_at, msg, communication_id, user_id)
+    SELECT id, created_at, msg, communication_id, user_id FROM messaging_message;
+    SELECT setval(
+        pg_get_serial_sequence('messaging_message_partitioned', 'id'),
+        COALESCE(max(id), 0) + 1,
+        false
+    )
+    FROM messaging_message_partitioned;
+
+    DROP TABLE messaging_message;
+    ALTER TABLE messaging_message_partitioned RENAME TO messaging_message;
+    ALTER TABLE messaging_message
+        RENAME CONSTRAINT messaging_message_partitioned_pkey TO messaging_message_pkey;
+    ALTER SEQUENCE messaging_message_partitioned_id_seq
+        RENAME TO messaging_message_id_seq;
+    CREATE INDEX messaging_message_user_id_idx ON messaging_message (user_id);
+"""
+
+UNPARTITION = """
+    -- Check the copied rows right away; indexes cannot be created on tables
+    -- with pending deferred constraint checks.
+    SET CONSTRAINTS ALL IMMEDIATE;
+
+    CREATE TABLE messaging_message_unpartitioned (
+        id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        created_at timestamp with time zone NOT NULL,
+        msg text NOT NULL,
+        communication_id bigint NOT NULL
+            REFERENCES messaging_communication (id) DEFERRABLE INITIALLY DEFERRED,
+        user_id bigint NOT NULL
+            REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED
+    );
+
+    INSERT INTO messaging_message_unpartitioned
+        (id, created_at, msg, communication_id, user_id)
+    SELECT id, created_at, msg, communication_id, user_id FROM messaging_message;
+    SELECT setval(
+        pg_get_serial_sequence('messaging_message_unpartitioned', 'id'),
+        COALESCE(max(id), 0) + 1,
+        false
+    )
+    FROM messaging_message_unpartitioned;
+
+    DROP TABLE messaging_message;
+    ALTER TABLE messaging_message_unpartitioned RENAME TO messaging_message;
+    ALTER TABLE messaging_message
+        RENAME CONSTRAINT messaging_message_unpartitioned_pkey
+        TO messaging_message_pkey;
+    ALTER SEQUENCE messaging_message_unpartitioned_id_seq
+        RENAME TO messaging_message_id_seq;
+    CREATE INDEX messaging_message_communication_id_idx
+        ON messaging_message (communication_id);
+    CREATE INDEX messaging_message_user_id_idx ON messaging_message (user_id);
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0002_message_user"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION, reverse_sql=UNPARTITION),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["communication", "created_at"],
+                name="message_comm_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0004_message_comm_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="communication",
+            name="from_user_last_read_message_id",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="communication",
+            name="from_user_unread_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="communication",
+            name="to_user_last_read_message_id",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="communication",
+            name="to_user_unread_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        # Existing conversations start out read.
+        migrations.RunSQL(
+            """
+            UPDATE messaging_communication
+            SET from_user_last_read_message_id = newest.id,
+                to_user_last_read_message_id = newest.id
+            FROM (
+                SELECT communication_id, MAX(id) AS id
+                FROM messaging_message
+                GROUP BY communication_id
+            ) AS newest
+            WHERE newest.communication_id = messaging_communication.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1 on 2026-10-18 10:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messaging", "0005_communication_read_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="communication",
+            name="last_activity_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="communication",
+            name="last_message_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="communication",
+            name="last_message_id",
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="communication",
+            name="last_message_preview",
+            field=models.CharField(default="", editable=False, max_length=100),
+        ),
+        # Communications without messages keep the time of the migration as
+        # their last activity.
+        migrations.RunSQL(
+            """
+            UPDATE messaging_communication
+            SET last_message_id = last_message.id,
+                last_message_preview = LEFT(last_message.msg, 100),
+                last_message_at = last_message.created_at,
+                last_activity_at = last_message.created_at
+            FROM (
+                SELECT DISTINCT ON (communication_id)
+                    communication_id, id, msg, created_at
+                FROM messaging_message
+                ORDER BY communication_id, id DESC
+            ) AS last_message
+            WHERE last_message.communication_id = messaging_communication.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,8 +1,61 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from config.models import InPlaceFieldsMixin
 from users.models import User
 
 
-class Communication(models.Model):
+class CommunicationQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """Communications ``user`` takes part in."""
+        return self.filter(
+            models.Q(from_user_id=user.pk) | models.Q(to_user_id=user.pk)
+        )
+
+    def with_read_state(self, user):
+        """Annotate the ``last_read_message_id`` and ``unread_count`` of
+        ``user``, who takes part in the communications."""
+        return self.annotate(
+            **{
+                name: models.Case(
+                    models.When(from_user_id=user.pk, then=f"from_user_{name}"),
+                    default=f"to_user_{name}",
+                )
+                for name in ("last_read_message_id", "unread_count")
+            }
+        )
+
+    def inbox(self, user):
+        """
+        The communications of ``user`` with their read state and the id and
+        username of the other participant, for the inbox.
+        """
+        is_sender = models.Q(from_user_id=user.pk)
+        return (
+            self.for_user(user)
+            .with_read_state(user)
+            .annotate(
+                other_user_id=models.Case(
+                    models.When(is_sender, then="to_user_id"),
+                    default="from_user_id",
+                ),
+                other_username=models.Case(
+                    models.When(is_sender, then="to_user__username"),
+                    default="from_user__username",
+                ),
+            )
+        )
+
+
+class MessageQuerySet(models.QuerySet):
+    def for_user(self, user):
+        """Messages of the communications ``user`` takes part in."""
+        return self.filter(
+            models.Q(communication__from_user_id=user.pk)
+            | models.Q(communication__to_user_id=user.pk)
+        )
+
+
+class Communication(InPlaceFieldsMixin, models.Model):
     """
     The Communication model represents a request for communication between two users.
 
@@ -10,6 +63,14 @@ class Communication(models.Model):
     - to_user (ForeignKey): The user receiving the communication request.
     - from_user (ForeignKey): The user sending the communication request.
     - status (CharField): The current status of the communication request. Choices are 'pending', 'accepted', 'rejected'.
+    - from_user_last_read_message_id, to_user_last_read_message_id (BigIntegerField):
+      The newest message each participant marked read.
+    - from_user_unread_count, to_user_unread_count (IntegerField): The messages
+      of the other participant after it; maintained by messaging.unread.
+    - last_message_id, last_message_preview, last_message_at: The newest
+      message, for the inbox; maintained by messaging.inbox.
+    - last_activity_at (DateTimeField): When the last message was sent, or the
+      communication created.
     """
 
     STATUS_CHOICES = [
@@ -24,20 +85,44 @@ class Communication(models.Model):
         User, related_name="sent_requests", on_delete=models.CASCADE
     )
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    from_user_last_read_message_id = models.BigIntegerField(default=0, editable=False)
+    from_user_unread_count = models.IntegerField(default=0, editable=False)
+    to_user_last_read_message_id = models.BigIntegerField(default=0, editable=False)
+    to_user_unread_count = models.IntegerField(default=0, editable=False)
+    # Not a foreign key: the primary key of the partitioned message table is
+    # (id, created_at).
+    last_message_id = models.BigIntegerField(null=True, editable=False)
+    last_message_preview = models.CharField(max_length=100, default="", editable=False)
+    last_message_at = models.DateTimeField(null=True, editable=False)
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = CommunicationQuerySet.as_manager()
+
+    # Maintained by messaging.unread and messaging.inbox.
+    in_place_fields = (
+        "from_user_last_read_message_id",
+        "from_user_unread_count",
+        "to_user_last_read_message_id",
+        "to_user_unread_count",
+        "last_message_id",
+        "last_message_preview",
+        "last_message_at",
+        "last_activity_at",
+    )
 
     def accept_communication(self):
         """
         Accepts the communication request by setting the status to 'accepted'.
         """
         self.status = "accepted"
-        self.save()
+        self.save(update_fields=["status"])
 
     def reject_communication(self):
         """
         Rejects the communication request by setting the status to 'rejected'.
         """
         self.status = "rejected"
-        self.save()
+        self.save(update_fields=["status"])
 
     def is_communication_allowed(self):
         """
@@ -58,19 +143,43 @@ class Communication(models.Model):
         Returns:
         - bool: True if the user is either the from_user or to_user, False otherwise.
         """
-        return self.from_user == user or self.to_user == user
+        return user.pk in (self.from_user_id, self.to_user_id)
 
     def __str__(self) -> str:
         return self.status
 
 
 class Message(models.Model):
-    """The Message model represents a message sent within a communication."""
+    """The Message model represents a message sent within a communication.
+
+    The table is partitioned by month of ``created_at`` (see migration 0003
+    and messaging.partitions); filtering on ``created_at`` lets PostgreSQL
+    skip the partitions outside of the range.
+    """
 
     communication = models.ForeignKey(Communication, on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name="messages", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     msg = models.TextField()
 
+    objects = MessageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Backs the message list of a communication, oldest first.
+            models.Index(
+                fields=["communication", "created_at"],
+                name="message_comm_created_idx",
+            ),
+            # Backs polling for the messages after a given id.
+            models.Index(fields=["communication", "id"], name="message_comm_id_idx"),
+        ]
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        # Commit the message together with the updates of its communication
+        # made by the post_save handlers; see messaging.unread.mark_read().
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Message from {self.user.username} at {self.created_at}"
@@ -0,0 +1,7 @@
+from posts.pagination import KeysetPagination
+
+
+class InboxPagination(KeysetPagination):
+    """Most recent activity first; the inbox is always paginated."""
+
+    ordering = ("-last_activity_at", "-id")
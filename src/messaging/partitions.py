@@ -0,0 +1,127 @@
+"""
+Monthly partitions of the message table.
+
+``messaging_message`` is partitioned by range of ``created_at``: one partition
+per calendar month (UTC), named ``messaging_message_yYYYYmMM``, plus a default
+partition catching rows no monthly partition covers. Partitions should exist
+before their month starts; old ones can be detached and kept as plain tables
+for archiving, or dropped.
+"""
+
+import re
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+TABLE = "messaging_message"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(moment):
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def monthly_partitions():
+    """Return the attached monthly partitions as a ``{month: name}`` dict."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [TABLE],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        if match := PARTITION_NAME.match(name):
+            year, month = map(int, match.groups())
+            partitions[datetime(year, month, 1, tzinfo=timezone.utc)] = name
+    return partitions
+
+
+@transaction.atomic
+def create_partition(month):
+    """
+    Create the partition of ``month``.
+
+    Rows of that month that already landed in the default partition are moved
+    into the new partition before it is attached.
+    """
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        # The table cannot be altered while deferred checks are pending.
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM "{DEFAULT_PARTITION}"
+                WHERE created_at >= %s AND created_at < %s
+                RETURNING *
+            )
+            INSERT INTO "{name}" SELECT * FROM moved
+            """,
+            [month, add_months(month, 1)],
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" '
+            "FOR VALUES FROM (%s) TO (%s)",
+            [month, add_months(month, 1)],
+        )
+    return name
+
+
+def detach_partition(month, drop=False):
+    """Detach the partition of ``month``, keeping it as a plain table unless
+    ``drop`` is set."""
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
+    return name
+
+
+def ensure_partitions(months_ahead, now=None):
+    """
+    Create the missing partitions from the current month up to
+    ``months_ahead`` months ahead. Returns the names of the new partitions.
+    """
+    current = month_start(now or datetime.now(timezone.utc))
+    existing = monthly_partitions()
+    return [
+        create_partition(month)
+        for month in (add_months(current, i) for i in range(months_ahead + 1))
+        if month not in existing
+    ]
+
+
+def detach_old_partitions(retain_months, drop=False, now=None):
+    """
+    Detach the partitions of the months before the last ``retain_months``
+    months (counting the current one). Returns the names of the partitions.
+    """
+    current = month_start(now or datetime.now(timezone.utc))
+    cutoff = add_months(current, 1 - retain_months)
+    return [
+        detach_partition(month, drop=drop)
+        for month in sorted(monthly_partitions())
+        if add_months(month, 1) <= cutoff
+    ]
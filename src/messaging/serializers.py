@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from config.serializers import FlexFieldsMixin
 from messaging.models import Message, Communication
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(FlexFieldsMixin, serializers.ModelSerializer):
     # Use a PrimaryKeyRelatedField for communication to reference it by ID
     communication = serializers.PrimaryKeyRelatedField(
         queryset=Communication.objects.all()
@@ -38,7 +39,7 @@ class CommunicationSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """Custom update method to ensure the recipient is the only one who can change the status."""
         request = self.context.get("request")
-        if request and request.user != instance.to_user:
+        if request and request.user.pk != instance.to_user_id:
             raise serializers.ValidationError(
                 "Only the recipient can update the status."
             )
@@ -47,5 +48,31 @@ class CommunicationSerializer(serializers.ModelSerializer):
         if "status" in validated_data:
             instance.status = validated_data["status"]
 
-        instance.save()
+        instance.save(update_fields=["status"])
         return instance
+
+
+class InboxSerializer(serializers.ModelSerializer):
+    """A communication in the inbox of the current user; reads the annotations
+    of ``CommunicationQuerySet.inbox()``."""
+
+    other_user = serializers.IntegerField(source="other_user_id", read_only=True)
+    other_username = serializers.CharField(read_only=True)
+    last_read_message_id = serializers.IntegerField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Communication
+        fields = [
+            "id",
+            "status",
+            "other_user",
+            "other_username",
+            "last_message_id",
+            "last_message_preview",
+            "last_message_at",
+            "last_activity_at",
+            "last_read_message_id",
+            "unread_count",
+        ]
+        read_only_fields = fields
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from messaging.broker import communication_channel, get_broker
+from messaging.inbox import (
+    last_message_changed,
+    last_message_removed,
+    last_message_updates,
+)
+from messaging.models import Communication, Message
+from messaging.unread import message_added, message_removed
+
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, raw=False, **kwargs):
+    """Push a new message to the streams of its communication."""
+    if created and not raw:
+        channel = communication_channel(instance.communication_id)
+        transaction.on_commit(lambda: get_broker().publish(channel, instance.pk))
+
+
+@receiver(post_save, sender=Message)
+def record_saved_message(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        # A single UPDATE of the communication for both.
+        message_added(instance, **last_message_updates(instance))
+    else:
+        last_message_changed(instance)
+
+
+@receiver(post_delete, sender=Message)
+def record_removed_message(sender, instance, origin=None, **kwargs):
+    # Nothing to update when the message goes away with its communication.
+    if getattr(origin, "model", type(origin)) is Communication:
+        return
+    message_removed(instance)
+    last_message_removed(instance)
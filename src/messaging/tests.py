@@ -1,9 +1,33 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from users.models import User
+from messaging import unread
+from messaging.async_views import fetch_and_release
+from messaging.broker import LocalBroker, PostgresBroker
 from messaging.models import Communication, Message
-from rest_framework_simplejwt.tokens import RefreshToken
+from messaging.serializers import CommunicationSerializer
+from messaging.unread import mark_read, message_added
+from messaging.partitions import (
+    add_months,
+    create_partition,
+    detach_old_partitions,
+    month_start,
+    monthly_partitions,
+)
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 
 class CommunicationTests(APITestCase):
@@ -214,8 +238,6 @@ class MessageTests(APITestCase):
         )
 
     def get_jwt_token(self, user):
-        from rest_framework_simplejwt.tokens import RefreshToken
-
         refresh = RefreshToken.for_user(user)
         return str(refresh.access_token)
 
@@ -235,6 +257,35 @@ class MessageTests(APITestCase):
         self.assertEqual(len(response.data), messages.count())
         self.assertGreaterEqual(len(response.data), 1)
 
+    def test_message_list_sparse_fields(self):
+        self.set_jwt_authentication(self.user2)
+        response = self.client.get(
+            self.message_list_url(self.communication1.id) + "?fields=id,msg"
+        )
+        self.assertEqual(
+            response.data,
+            [{"id": self.message1.id, "msg": "Message for communication1"}],
+        )
+
+    def test_message_list_time_bounds(self):
+        old = Message.objects.create(
+            communication=self.communication1, user=self.user1, msg="Old message"
+        )
+        Message.objects.filter(pk=old.pk).update(
+            created_at=datetime(2020, 1, 15, tzinfo=timezone.utc)
+        )
+        self.set_jwt_authentication(self.user2)
+        url = self.message_list_url(self.communication1.id)
+
+        response = self.client.get(url)
+        self.assertEqual([m["id"] for m in response.data], [old.id, self.message1.id])
+        response = self.client.get(url + "?since=2021-01-01T00:00:00Z")
+        self.assertEqual([m["id"] for m in response.data], [self.message1.id])
+        response = self.client.get(url + "?until=yesterday")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url + "?until=2021-01-01T00:00:00")
+        self.assertEqual([m["id"] for m in response.data], [old.id])
+
     def test_message_list_as_non_participant(self):
         # Authenticate as user4, who is not a participant in any communication
         self.set_jwt_authentication(self.user4)
@@ -251,6 +302,60 @@ class MessageTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["msg"], "Message for communication1")
 
+    def test_message_reads_are_single_queries(self):
+        self.set_jwt_authentication(self.user2)
+        # The authenticated user, then the messages or the message.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.message_list_url(self.communication1.id))
+        self.assertEqual(len(response.data), 1)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.message_detail_url1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_empty_message_list_as_participant(self):
+        communication = Communication.objects.create(
+            to_user=self.user4, from_user=self.user1, status="accepted"
+        )
+        self.set_jwt_authentication(self.user4)
+        response = self.client.get(self.message_list_url(communication.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_async_message_views_match_sync_ones(self):
+        self.set_jwt_authentication(self.user2)
+        url = self.message_list_url(self.communication1.id)
+        async_url = reverse(
+            "messaging:async-message-list", args=[self.communication1.id]
+        )
+        for query in ("", "?fields=id,msg", "?since=2021-01-01T00:00:00Z"):
+            response = self.client.get(async_url + query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, self.client.get(url + query).content)
+
+        response = self.client.get(
+            reverse("messaging:async-message-detail", args=[self.message1.id])
+        )
+        self.assertEqual(
+            response.content, self.client.get(self.message_detail_url1).content
+        )
+
+    def test_async_message_views_as_non_participant(self):
+        self.set_jwt_authentication(self.user4)
+        response = self.client.get(
+            reverse("messaging:async-message-list", args=[self.communication1.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(
+            reverse("messaging:async-message-detail", args=[self.message1.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.credentials()
+        response = self.client.get(
+            reverse("messaging:async-message-detail", args=[self.message1.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_message_detail_as_non_participant(self):
         # Authenticate as user1, who is not a participant in communication2
         self.set_jwt_authentication(self.user1)
@@ -323,3 +428,505 @@ class MessageTests(APITestCase):
         self.set_jwt_authentication(self.user2)
         response = self.client.delete(self.message_detail_url2)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MessagePartitionTests(APITestCase):
+    """Test the monthly partitions of the message table"""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            username="testuser1",
+            password="testpassword",
+            email="test_user1@mail.com",
+        )
+        self.user2 = User.objects.create_user(
+            username="testuser2",
+            password="testpassword",
+            email="test_user2@mail.com",
+        )
+        self.communication = Communication.objects.create(
+            to_user=self.user1, from_user=self.user2, status="accepted"
+        )
+        self.current = month_start(datetime.now(timezone.utc))
+
+    def create_message(self, created_at):
+        message = Message.objects.create(
+            communication=self.communication, user=self.user2, msg="Hello"
+        )
+        Message.objects.filter(pk=message.pk).update(created_at=created_at)
+        return message
+
+    def partition_of(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM messaging_message WHERE id = %s",
+                [message.id],
+            )
+            return cursor.fetchone()[0]
+
+    def test_future_partitions_take_over_default_rows(self):
+        future = add_months(self.current, 6)
+        message = self.create_message(future)
+        self.assertEqual(self.partition_of(message), "messaging_message_default")
+
+        stdout = StringIO()
+        call_command("message_partitions", "--months-ahead=6", stdout=stdout)
+        self.assertIn("Created messaging_message_", stdout.getvalue())
+        for i in range(7):
+            self.assertIn(add_months(self.current, i), monthly_partitions())
+        self.assertEqual(
+            self.partition_of(message),
+            f"messaging_message_y{future.year:04d}m{future.month:02d}",
+        )
+
+    def test_old_partitions_are_detached(self):
+        old = add_months(self.current, -24)
+        create_partition(old)
+        message = self.create_message(old)
+
+        detached = detach_old_partitions(retain_months=12)
+        self.assertIn(f"messaging_message_y{old.year:04d}m{old.month:02d}", detached)
+        self.assertNotIn(old, monthly_partitions())
+        self.assertFalse(Message.objects.filter(pk=message.pk).exists())
+
+
+class UnreadTests(APITestCase):
+    """Test the read state and unread counters of communications"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username="testuser1", password="testpassword", email="test1@mail.com"
+        )
+        self.recipient = User.objects.create_user(
+            username="testuser2", password="testpassword", email="test2@mail.com"
+        )
+        self.communication = Communication.objects.create(
+            from_user=self.sender, to_user=self.recipient, status="accepted"
+        )
+        self.read_url = reverse(
+            "messaging:communication-read", args=[self.communication.id]
+        )
+        self.summary_url = reverse("messaging:unread-summary")
+
+    def set_jwt_authentication(self, user):
+        token = AccessToken.for_user(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def send(self, user, count=1):
+        return [
+            Message.objects.create(
+                communication=self.communication, user=user, msg="Hello"
+            )
+            for _ in range(count)
+        ]
+
+    def unread_counts(self):
+        self.communication.refresh_from_db()
+        return (
+            self.communication.from_user_unread_count,
+            self.communication.to_user_unread_count,
+        )
+
+    def test_messages_count_as_unread_for_the_other_participant(self):
+        self.send(self.sender, 3)
+        self.send(self.recipient)
+        self.assertEqual(self.unread_counts(), (1, 3))
+
+        self.communication.message_set.filter(user=self.sender).first().delete()
+        self.assertEqual(self.unread_counts(), (1, 2))
+
+    def test_mark_read(self):
+        first, second, third = self.send(self.sender, 3)
+        self.set_jwt_authentication(self.recipient)
+
+        response = self.client.post(self.read_url, {"message_id": first.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (response.data["last_read_message_id"], response.data["unread_count"]),
+            (first.id, 2),
+        )
+        # Removing a message already read does not change the count.
+        first.delete()
+        self.assertEqual(self.unread_counts(), (0, 2))
+
+        response = self.client.post(self.read_url)
+        self.assertEqual(
+            (response.data["last_read_message_id"], response.data["unread_count"]),
+            (third.id, 0),
+        )
+        # The read position never moves back.
+        response = self.client.post(self.read_url, {"message_id": second.id})
+        self.assertEqual(response.data["last_read_message_id"], third.id)
+
+    def test_status_change_keeps_concurrent_counts(self):
+        update = CommunicationSerializer.update
+
+        def update_after_new_message(serializer, instance, validated_data):
+            # A message arrives after the view loaded the communication.
+            self.send(self.sender)
+            return update(serializer, instance, validated_data)
+
+        self.set_jwt_authentication(self.recipient)
+        with patch.object(CommunicationSerializer, "update", update_after_new_message):
+            response = self.client.patch(
+                reverse("messaging:communication-detail", args=[self.communication.id]),
+                {"status": "rejected"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.unread_counts(), (0, 1))
+
+        stale = Communication.objects.get(pk=self.communication.pk)
+        message = self.send(self.sender)[0]
+        stale.accept_communication()
+        self.communication.refresh_from_db()
+        self.assertEqual(self.communication.status, "accepted")
+        self.assertEqual(self.communication.to_user_unread_count, 2)
+        self.assertEqual(self.communication.last_message_id, message.id)
+
+    def test_mark_read_as_non_participant(self):
+        outsider = User.objects.create_user(
+            username="testuser3", password="testpassword", email="test3@mail.com"
+        )
+        self.set_jwt_authentication(outsider)
+        response = self.client.post(self.read_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unread_summary_reads_the_counters(self):
+        other = Communication.objects.create(
+            from_user=self.recipient,
+            to_user=User.objects.create_user(
+                username="testuser3", password="testpassword", email="test3@mail.com"
+            ),
+            status="accepted",
+        )
+        Message.objects.create(communication=other, user=self.recipient, msg="Hi")
+        self.send(self.sender, 2)
+        self.set_jwt_authentication(self.recipient)
+
+        with self.assertNumQueries(2):  # The user and the communications.
+            response = self.client.get(self.summary_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 2)
+        self.assertEqual(
+            [(c["id"], c["unread_count"]) for c in response.data["communications"]],
+            [(self.communication.id, 2)],
+        )
+
+    def test_reconcile_unread_counts(self):
+        self.send(self.sender, 2)
+        Communication.objects.update(from_user_unread_count=5, to_user_unread_count=0)
+        stdout = StringIO()
+        call_command("reconcile_unread_counts", "--batch-size=1", stdout=stdout)
+        self.assertIn("Repaired 1 communications.", stdout.getvalue())
+        self.assertEqual(self.unread_counts(), (0, 2))
+
+
+class UnreadConcurrencyTests(TransactionTestCase):
+    """Test the unread counters against messages added concurrently"""
+
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username="testuser1", password="testpassword", email="test1@mail.com"
+        )
+        self.recipient = User.objects.create_user(
+            username="testuser2", password="testpassword", email="test2@mail.com"
+        )
+        self.communication = Communication.objects.create(
+            from_user=self.sender, to_user=self.recipient, status="accepted"
+        )
+
+    def test_mark_read_while_a_message_is_added(self):
+        first = Message.objects.create(
+            communication=self.communication, user=self.sender, msg="First"
+        )
+        inserted, marked = threading.Event(), threading.Event()
+
+        def slow_message_added(message, **updates):
+            # Hold the counter update back until mark_read() is done, or gave
+            # up waiting for it.
+            inserted.set()
+            marked.wait(1)
+            message_added(message, **updates)
+
+        def send():
+            try:
+                Message.objects.create(
+                    communication=self.communication, user=self.sender, msg="Late"
+                )
+            finally:
+                connection.close()
+
+        with patch("messaging.signals.message_added", slow_message_added):
+            sender = threading.Thread(target=send)
+            sender.start()
+            self.assertTrue(inserted.wait(5))
+            mark_read(self.communication, self.recipient, message_id=first.id)
+            marked.set()
+            sender.join()
+
+        self.communication.refresh_from_db()
+        self.assertEqual(self.communication.to_user_unread_count, 1)
+
+    def test_reconcile_keeps_concurrent_messages(self):
+        Communication.objects.update(to_user_unread_count=5)
+        drifted = unread._drifted
+
+        def drifted_then_message(communications):
+            # A message arrives after the counts were checked.
+            Message.objects.create(
+                communication=self.communication, user=self.sender, msg="Late"
+            )
+            return drifted(communications)
+
+        with patch("messaging.unread._drifted", drifted_then_message):
+            self.assertEqual(list(unread.reconcile_unread_counts()), [1])
+        self.communication.refresh_from_db()
+        self.assertEqual(self.communication.to_user_unread_count, 1)
+
+
+class InboxTests(APITestCase):
+    """Test the inbox and the last messages of communications"""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            username="testuser1", password="testpassword", email="test1@mail.com"
+        )
+        self.user2 = User.objects.create_user(
+            username="testuser2", password="testpassword", email="test2@mail.com"
+        )
+        self.user3 = User.objects.create_user(
+            username="testuser3", password="testpassword", email="test3@mail.com"
+        )
+        self.older = Communication.objects.create(
+            from_user=self.user1, to_user=self.user2, status="accepted"
+        )
+        self.newer = Communication.objects.create(
+            from_user=self.user3, to_user=self.user1, status="accepted"
+        )
+        self.url = reverse("messaging:inbox")
+        token = AccessToken.for_user(self.user1)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def send(self, communication, user, text):
+        return Message.objects.create(communication=communication, user=user, msg=text)
+
+    def test_inbox_lists_last_messages_by_activity(self):
+        self.send(self.newer, self.user3, "Hi")
+        self.send(self.older, self.user1, "First")
+        last = self.send(self.older, self.user2, "x" * 150)
+
+        with self.assertNumQueries(2):  # The user and the page.
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, second = response.data["results"]
+        self.assertEqual(
+            (first["id"], first["other_username"], first["last_message_id"]),
+            (self.older.id, "testuser2", last.id),
+        )
+        self.assertEqual(first["last_message_preview"], "x" * 100)
+        self.assertEqual(first["unread_count"], 1)
+        self.assertEqual(
+            (second["id"], second["other_user"], second["last_message_preview"]),
+            (self.newer.id, self.user3.id, "Hi"),
+        )
+
+    def test_inbox_pages(self):
+        response = self.client.get(self.url, {"page_size": 1})
+        self.assertEqual([c["id"] for c in response.data["results"]], [self.newer.id])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([c["id"] for c in response.data["results"]], [self.older.id])
+        self.assertIsNone(response.data["next"])
+
+    def test_last_message_follows_edits_and_deletes(self):
+        first = self.send(self.older, self.user1, "First")
+        second = self.send(self.older, self.user2, "Second")
+        second.msg = "Edited"
+        second.save()
+        self.older.refresh_from_db()
+        self.assertEqual(self.older.last_message_preview, "Edited")
+
+        second.delete()
+        self.older.refresh_from_db()
+        self.assertEqual(
+            (self.older.last_message_id, self.older.last_message_preview),
+            (first.id, "First"),
+        )
+        first.delete()
+        self.older.refresh_from_db()
+        self.assertEqual(
+            (self.older.last_message_id, self.older.last_message_at), (None, None)
+        )
+
+
+class MessageStreamTests(TransactionTestCase):
+    """Test the message streams, long polls and their brokers"""
+
+    databases = "__all__"
+
+    def setUp(self):
+        self.sender = User.objects.create_user(
+            username="testuser1", password="testpassword", email="test1@mail.com"
+        )
+        self.recipient = User.objects.create_user(
+            username="testuser2", password="testpassword", email="test2@mail.com"
+        )
+        self.communication = Communication.objects.create(
+            from_user=self.sender, to_user=self.recipient, status="accepted"
+        )
+        self.url = reverse("messaging:message-stream", args=[self.communication.id])
+
+    async def open_stream(self, user, **headers):
+        token = AccessToken.for_user(user)
+        return await AsyncClient().get(
+            self.url, headers={"Authorization": f"Bearer {token}", **headers}
+        )
+
+    async def read_event(self, events):
+        event = (await asyncio.wait_for(anext(events), 5)).decode()
+        if event.startswith("id:"):
+            return json.loads(event.split("data: ", 1)[1])
+        return event
+
+    async def test_stream_pushes_new_messages(self):
+        response = await self.open_stream(self.recipient)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        self.assertEqual(await self.read_event(events), "retry: 3000\n\n")
+
+        message = await Message.objects.acreate(
+            communication=self.communication, user=self.sender, msg="Hello"
+        )
+        event = await self.read_event(events)
+        self.assertEqual((event["id"], event["msg"]), (message.id, "Hello"))
+        await events.aclose()
+
+    @override_settings(MESSAGING_STREAM_HEARTBEAT=0.05)
+    async def test_stream_resumes_after_last_event_id(self):
+        first, second, third = [
+            await Message.objects.acreate(
+                communication=self.communication, user=self.sender, msg=text
+            )
+            for text in ("One", "Two", "Three")
+        ]
+        response = await self.open_stream(
+            self.sender, **{"Last-Event-ID": str(first.id)}
+        )
+        events = aiter(response.streaming_content)
+        await self.read_event(events)
+        self.assertEqual((await self.read_event(events))["id"], second.id)
+        self.assertEqual((await self.read_event(events))["id"], third.id)
+        self.assertEqual(await self.read_event(events), ": heartbeat\n\n")
+        await events.aclose()
+
+    async def poll(self, user, **params):
+        token = AccessToken.for_user(user)
+        return await AsyncClient().get(
+            reverse("messaging:message-poll", args=[self.communication.id]),
+            params,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    async def test_poll_returns_newer_messages_at_once(self):
+        first, second = [
+            await Message.objects.acreate(
+                communication=self.communication, user=self.sender, msg=text
+            )
+            for text in ("One", "Two")
+        ]
+        response = await self.poll(self.recipient, since_id=first.id, timeout=30)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m["id"] for m in response.json()], [second.id])
+
+    async def test_poll_waits_for_a_new_message(self):
+        async def send():
+            await asyncio.sleep(0.2)
+            return await Message.objects.acreate(
+                communication=self.communication, user=self.sender, msg="Hello"
+            )
+
+        response, message = await asyncio.gather(
+            self.poll(self.recipient, since_id=0, timeout=5), send()
+        )
+        self.assertEqual(
+            [(m["id"], m["msg"]) for m in response.json()], [(message.id, "Hello")]
+        )
+
+    async def test_poll_reads_only_recent_messages(self):
+        message = await Message.objects.acreate(
+            communication=self.communication, user=self.sender, msg="Read"
+        )
+        queries = []
+
+        async def recording_fetch(queryset):
+            queries.append(str(queryset.query))
+            return await fetch_and_release(queryset)
+
+        async def send():
+            await asyncio.sleep(0.2)
+            return await Message.objects.acreate(
+                communication=self.communication, user=self.sender, msg="New"
+            )
+
+        with patch("messaging.async_views.fetch_and_release", recording_fetch):
+            # Nothing is newer: the message table is not queried.
+            response = await self.poll(self.recipient, since_id=message.id, timeout=0)
+            self.assertEqual(response.json(), [])
+            self.assertFalse([q for q in queries if "messaging_message" in q])
+
+            response, new = await asyncio.gather(
+                self.poll(self.recipient, since_id=message.id, timeout=5), send()
+            )
+        self.assertEqual([m["id"] for m in response.json()], [new.id])
+        # The partitions older than the wait are skipped.
+        self.assertIn('"messaging_message"."created_at" >=', queries[-1])
+
+    async def test_poll_times_out_empty(self):
+        response = await self.poll(self.recipient, since_id=0, timeout=1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
+
+    async def test_poll_is_for_participants_only(self):
+        outsider = await sync_to_async(User.objects.create_user)(
+            username="testuser3", password="testpassword", email="test3@mail.com"
+        )
+        response = await self.poll(outsider, since_id=0, timeout=1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = await self.poll(self.recipient, since_id="x")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_stream_is_for_participants_only(self):
+        outsider = await sync_to_async(User.objects.create_user)(
+            username="testuser3", password="testpassword", email="test3@mail.com"
+        )
+        response = await self.open_stream(outsider)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MESSAGING_STREAM_QUEUE_SIZE=2)
+    async def test_slow_subscriptions_lag_instead_of_buffering(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe("channel")
+        for message_id in range(3):
+            broker.publish("channel", message_id)
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.lagging)
+        self.assertEqual(await subscription.get(1), [0, 1])
+        subscription.close()
+        self.assertEqual(broker.subscriptions, {})
+
+    async def test_postgres_broker_delivers_notifications(self):
+        broker = PostgresBroker()
+        broker.poll_interval = 0.1
+        subscription = broker.subscribe("channel")
+        try:
+            # The listener may not be listening yet.
+            for _ in range(50):
+                await sync_to_async(broker.publish)("channel", 7)
+                try:
+                    message_ids = await subscription.get(0.1)
+                    break
+                except TimeoutError:
+                    pass
+            self.assertEqual(message_ids[0], 7)
+        finally:
+            subscription.close()
+            await sync_to_async(broker.stop)()
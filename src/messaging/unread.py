@@ -0,0 +1,158 @@
+"""
+Read state of communications.
+
+Each participant of a communication has a ``<side>_last_read_message_id``, the
+newest message they marked read, and a ``<side>_unread_count``: the number of
+messages of the other participant after it. The side is ``from_user`` or
+``to_user``. The counters change in place when a message is added or removed
+and when a participant marks the communication read. The unread summary only
+reads them; it never counts over the message table.
+``reconcile_unread_counts`` repairs any drift, e.g. from writes that bypassed
+the model signals.
+"""
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+
+from messaging.models import Communication, Message
+
+# (reader, author) pairs: a message of the author is unread for the reader.
+SIDES = (("from_user", "to_user"), ("to_user", "from_user"))
+
+
+def side_of(communication, user):
+    return "from_user" if user.pk == communication.from_user_id else "to_user"
+
+
+def _adjust_unread(message, delta, updates):
+    for reader, author in SIDES:
+        count = f"{reader}_unread_count"
+        updates[count] = Case(
+            When(
+                Q(**{f"{author}_id": message.user_id})
+                # Unless the reader already read past it.
+                & Q(**{f"{reader}_last_read_message_id__lt": message.id}),
+                then=F(count) + delta,
+            ),
+            default=F(count),
+        )
+    Communication.objects.filter(pk=message.communication_id).update(**updates)
+
+
+def message_added(message, **updates):
+    """Count ``message`` as unread; ``updates`` of the communication are made
+    in the same query."""
+    _adjust_unread(message, 1, updates)
+
+
+def message_removed(message):
+    _adjust_unread(message, -1, {})
+
+
+@transaction.atomic
+def mark_read(communication, user, message_id=None):
+    """
+    Mark the messages of ``communication`` up to ``message_id``, or all of
+    them, read for ``user``. The read position never moves back.
+
+    Returns the new ``(last_read_message_id, unread_count)``.
+    """
+    side = side_of(communication, user)
+    last_read_field = f"{side}_last_read_message_id"
+    # A message commits together with its counter update (see Message.save),
+    # and both wait for this lock: the count below sees either both or neither.
+    last_read = (
+        Communication.objects.select_for_update()
+        .values_list(last_read_field, flat=True)
+        .get(pk=communication.pk)
+    )
+    messages = Message.objects.filter(communication_id=communication.pk)
+    newest = messages.aggregate(id=Max("id"))["id"] or 0
+    if message_id is None or message_id > newest:
+        message_id = newest
+    last_read = max(last_read, message_id)
+
+    unread = 0
+    if last_read < newest:
+        unread = messages.filter(id__gt=last_read).exclude(user_id=user.pk).count()
+    Communication.objects.filter(pk=communication.pk).update(
+        **{last_read_field: last_read, f"{side}_unread_count": unread}
+    )
+    return last_read, unread
+
+
+def _actual_unread():
+    """Updates setting the unread counts of a communication from its messages."""
+    updates = {}
+    for reader, author in SIDES:
+        unread = (
+            Message.objects.filter(
+                communication=OuterRef("pk"),
+                id__gt=OuterRef(f"{reader}_last_read_message_id"),
+                user_id=OuterRef(f"{author}_id"),
+            )
+            .order_by()
+            .values("communication")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        updates[f"{reader}_unread_count"] = Coalesce(Subquery(unread), 0)
+    return updates
+
+
+def _drifted(communications):
+    return [
+        communication.pk
+        for communication in communications
+        if any(
+            getattr(communication, f"{reader}_unread_count")
+            != getattr(communication, f"actual_{reader}_unread")
+            for reader, _ in SIDES
+        )
+    ]
+
+
+def reconcile_unread_counts(batch_size=1000):
+    """
+    Recount the unread messages of all communications, ``batch_size``
+    communications at a time.
+
+    Yields the number of communications repaired per batch.
+    """
+    last_id = 0
+    while True:
+        communications = list(
+            Communication.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .annotate(
+                **{
+                    f"actual_{reader}_unread": Count(
+                        "message",
+                        filter=Q(
+                            message__id__gt=F(f"{reader}_last_read_message_id"),
+                            message__user_id=F(f"{author}_id"),
+                        ),
+                    )
+                    for reader, author in SIDES
+                }
+            )
+            .only("id", "from_user_unread_count", "to_user_unread_count")[:batch_size]
+        )
+        if not communications:
+            return
+
+        drifted = _drifted(communications)
+        if drifted:
+            with transaction.atomic():
+                # Once locked, messages being added have committed with their
+                # increments; the UPDATE counts them instead of overwriting.
+                list(
+                    Communication.objects.select_for_update()
+                    .filter(pk__in=drifted)
+                    .values_list("pk", flat=True)
+                )
+                Communication.objects.filter(pk__in=drifted).update(**_actual_unread())
+
+        last_id = communications[-1].id
+        yield len(drifted)
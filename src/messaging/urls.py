@@ -1,9 +1,18 @@
 from django.urls import path
+from messaging.async_views import (
+    AsyncMessageDetail,
+    AsyncMessageList,
+    AsyncMessagePoll,
+    AsyncMessageStream,
+)
 from messaging.views import (
     CommunicationList,
     CommunicationDetail,
+    CommunicationRead,
+    Inbox,
     MessageList,
     MessageDetail,
+    UnreadSummary,
 )
 
 app_name = "messaging"
@@ -15,10 +24,37 @@ urlpatterns = [
         CommunicationDetail.as_view(),
         name="communication-detail",
     ),
+    path(
+        "communications/<int:pk>/read/",
+        CommunicationRead.as_view(),
+        name="communication-read",
+    ),
+    path("inbox/", Inbox.as_view(), name="inbox"),
+    path("communications/unread/", UnreadSummary.as_view(), name="unread-summary"),
     path(
         "communications/<int:communication_id>/messages/",
         MessageList.as_view(),
         name="message-list",
     ),
     path("messages/<int:pk>/", MessageDetail.as_view(), name="message-detail"),
+    path(
+        "async/communications/<int:communication_id>/messages/",
+        AsyncMessageList.as_view(),
+        name="async-message-list",
+    ),
+    path(
+        "async/messages/<int:pk>/",
+        AsyncMessageDetail.as_view(),
+        name="async-message-detail",
+    ),
+    path(
+        "async/communications/<int:communication_id>/messages/stream/",
+        AsyncMessageStream.as_view(),
+        name="message-stream",
+    ),
+    path(
+        "async/communications/<int:communication_id>/messages/poll/",
+        AsyncMessagePoll.as_view(),
+        name="message-poll",
+    ),
 ]
@@ -1,13 +1,49 @@
 from messaging.models import Message, Communication
-from messaging.serializers import MessageSerializer, CommunicationSerializer
+from messaging.serializers import (
+    CommunicationSerializer,
+    InboxSerializer,
+    MessageSerializer,
+)
 from rest_framework import generics
-from rest_framework.exceptions import PermissionDenied
-
-
-class MessageList(generics.ListCreateAPIView):
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from config.fastpath import FastListMixin
+from config.serializers import select_fields
+from messaging.pagination import InboxPagination
+from messaging.unread import mark_read
+
+
+TIME_BOUNDS = {"since": "created_at__gte", "until": "created_at__lt"}
+
+
+def parse_time_bounds(query_params):
+    """Turn ``?since=`` and ``?until=`` into ``created_at`` lookups."""
+    bounds = {}
+    for param, lookup in TIME_BOUNDS.items():
+        value = query_params.get(param)
+        if value is None:
+            continue
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({param: "An ISO 8601 date and time is required."})
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        bounds[lookup] = moment
+    return bounds
+
+
+class MessageList(FastListMixin, generics.ListCreateAPIView):
     """
     This class handles listing and creating messages in our REST API.
     - GET: List messages in a specific communication where the user is a participant.
+      Messages are listed oldest first; ``?since=`` and ``?until=`` (ISO 8601)
+      bound ``created_at``, so only the monthly partitions in range are read.
     - POST: Create a new message in a communication, only if the user is a participant.
     """
 
@@ -21,20 +57,36 @@ class MessageList(generics.ListCreateAPIView):
         if not communication_id:
             raise PermissionDenied("Communication ID is required to list messages.")
 
-        # Retrieve the communication object
-        try:
-            communication = Communication.objects.get(id=communication_id)
-        except Communication.DoesNotExist:
-            raise PermissionDenied("Communication not found.")
-
-        # Check if the user is a participant in the communication
-        if not communication.is_participant(self.request.user):
-            raise PermissionDenied(
-                "You are not allowed to view messages in this communication."
-            )
-
-        # If the user is a participant, return the messages in the communication
-        return Message.objects.filter(communication=communication)
+        # Access is part of the query; see list() for non-participants.
+        queryset = (
+            Message.objects.for_user(self.request.user)
+            .filter(communication_id=communication_id)
+            .order_by("created_at", "id")
+        )
+        if self.request.method == "GET":
+            queryset = queryset.filter(**self.get_time_bounds())
+            # Only load the columns of the requested fields.
+            queryset = select_fields(queryset, self.get_serializer())
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not response.data:
+            # An empty result does not tell an empty communication from one
+            # the user may not read; only then is the communication looked up.
+            communication_id = self.kwargs["communication_id"]
+            if (
+                not Communication.objects.for_user(request.user)
+                .filter(pk=communication_id)
+                .exists()
+            ):
+                raise PermissionDenied(
+                    "You are not allowed to view messages in this communication."
+                )
+        return response
+
+    def get_time_bounds(self):
+        return parse_time_bounds(self.request.query_params)
 
     def perform_create(self, serializer):
         """
@@ -68,25 +120,14 @@ class MessageDetail(generics.RetrieveUpdateDestroyAPIView):
         Filter messages so that users can only retrieve messages if they are a participant
         in the related communication.
         """
-        return Message.objects.filter(
-            communication__from_user=self.request.user
-        ) | Message.objects.filter(communication__to_user=self.request.user)
-
-    def get_object(self):
-        """
-        Retrieve the message and ensure the requesting user is a participant in the communication.
-        """
-        obj = super().get_object()
-        if not obj.communication.is_participant(self.request.user):
-            raise PermissionDenied("You are not allowed to view this message.")
-        return obj
+        return Message.objects.for_user(self.request.user)
 
     def perform_update(self, serializer):
         """
         Ensure that only the author of the message can update it.
         """
-        message = self.get_object()  # Get the message object
-        if message.user != self.request.user:
+        message = serializer.instance
+        if message.user_id != self.request.user.pk:
             raise PermissionDenied("You are not allowed to modify this message.")
         serializer.save()
 
@@ -94,7 +135,7 @@ class MessageDetail(generics.RetrieveUpdateDestroyAPIView):
         """
         Ensure that only the author of the message can delete it.
         """
-        if instance.user != self.request.user:
+        if instance.user_id != self.request.user.pk:
             raise PermissionDenied("You are not allowed to delete this message.")
         instance.delete()
 
@@ -108,9 +149,7 @@ class CommunicationList(generics.ListCreateAPIView):
         """
         Filter communications to only show those where the user is a participant.
         """
-        return Communication.objects.filter(
-            from_user=self.request.user
-        ) | Communication.objects.filter(to_user=self.request.user)
+        return Communication.objects.for_user(self.request.user)
 
     def perform_create(self, serializer):
         """
@@ -126,6 +165,21 @@ class CommunicationList(generics.ListCreateAPIView):
         serializer.save(from_user=from_user)
 
 
+class Inbox(FastListMixin, generics.ListAPIView):
+    """This class lists the communications of the current user for an inbox.
+
+    - GET: Each communication with the other participant, a preview of the
+      last message and the unread count, most recent activity first. The last
+      message is kept on the communication, so a page is a single query.
+    """
+
+    serializer_class = InboxSerializer
+    pagination_class = InboxPagination
+
+    def get_queryset(self):
+        return Communication.objects.inbox(self.request.user)
+
+
 class CommunicationDetail(generics.RetrieveUpdateDestroyAPIView):
     """This class handles operations for a single communication instance."""
 
@@ -135,27 +189,16 @@ class CommunicationDetail(generics.RetrieveUpdateDestroyAPIView):
         """
         Filter communications so that users can only access communications where they are a participant.
         """
-        return Communication.objects.filter(
-            from_user=self.request.user
-        ) | Communication.objects.filter(to_user=self.request.user)
-
-    def get_object(self):
-        """
-        Retrieve the object, ensuring that the user is a participant in the communication.
-        """
-        obj = super().get_object()
-        if obj.from_user != self.request.user and obj.to_user != self.request.user:
-            raise PermissionDenied("You are not allowed to access this communication.")
-        return obj
+        return Communication.objects.for_user(self.request.user)
 
     def perform_update(self, serializer):
         """
         Ensure that only the recipient of the communication can update its status.
         """
-        communication = self.get_object()
+        communication = serializer.instance
 
         # Check if the user is the recipient
-        if communication.to_user != self.request.user:
+        if communication.to_user_id != self.request.user.pk:
             raise PermissionDenied("You are not allowed to modify this communication.")
 
         serializer.save()
@@ -164,9 +207,60 @@ class CommunicationDetail(generics.RetrieveUpdateDestroyAPIView):
         """
         Ensure that only participants of the communication can delete it.
         """
-        if (
-            instance.from_user != self.request.user
-            and instance.to_user != self.request.user
-        ):
+        if not instance.is_participant(self.request.user):
             raise PermissionDenied("You are not allowed to delete this communication.")
         instance.delete()
+
+
+class CommunicationRead(APIView):
+    """This class marks a communication read for the current user.
+
+    - POST: Mark the messages up to ``message_id`` read, or all of them if it
+      is left out. Returns the read position and the remaining unread count.
+    """
+
+    def post(self, request, pk):
+        communication = generics.get_object_or_404(
+            Communication.objects.for_user(request.user).only(
+                "id", "from_user_id", "to_user_id"
+            ),
+            pk=pk,
+        )
+        message_id = request.data.get("message_id")
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                raise ValidationError({"message_id": "A valid integer is required."})
+
+        last_read, unread = mark_read(communication, request.user, message_id)
+        return Response(
+            {
+                "id": communication.id,
+                "last_read_message_id": last_read,
+                "unread_count": unread,
+            }
+        )
+
+
+class UnreadSummary(APIView):
+    """This class summarizes the unread messages of the current user.
+
+    - GET: The total unread count and the communications with unread messages,
+      read from the counters kept on each communication.
+    """
+
+    def get(self, request):
+        communications = list(
+            Communication.objects.for_user(request.user)
+            .with_read_state(request.user)
+            .filter(unread_count__gt=0)
+            .order_by("id")
+            .values("id", "last_read_message_id", "unread_count")
+        )
+        return Response(
+            {
+                "total": sum(c["unread_count"] for c in communications),
+                "communications": communications,
+            }
+        )
@@ -0,0 +1,100 @@
+"""
+Denormalized comment activity on posts.
+
+``Post.comment_count`` and ``Post.last_activity_at`` are adjusted in place
+whenever a comment is added or removed, so lists can show and sort by activity
+without aggregating over the comment table. ``reconcile_post_activity`` repairs
+any drift, e.g. from writes that bypassed the model signals, and invalidates
+the cached responses of the posts it repairs.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from posts.cache import invalidate_posts
+from posts.models import Comment, Post
+
+
+def comment_added(post_id, created_at, count=1):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F("comment_count") + count,
+        last_activity_at=Greatest("last_activity_at", Value(created_at)),
+        updated_at=timezone.now(),
+    )
+
+
+def comment_removed(post_id):
+    # The last activity stays where it is: the comment was written after all.
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F("comment_count") - 1, updated_at=timezone.now()
+    )
+
+
+def _actual_activity():
+    """Updates setting the comment activity of a post from its comments."""
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by().values("post")
+    newest_comment_at = comments.annotate(newest=Max("created_at")).values("newest")
+    return {
+        "comment_count": Coalesce(
+            Subquery(comments.annotate(count=Count("pk")).values("count")), 0
+        ),
+        # Like comment_removed(), never move the last activity back.
+        "last_activity_at": Greatest(
+            "last_activity_at", "created_at", Subquery(newest_comment_at)
+        ),
+    }
+
+
+def _drifted(posts):
+    return [
+        post.pk
+        for post in posts
+        if post.comment_count != post.actual_count
+        or post.last_activity_at
+        < max(post.created_at, post.newest_comment_at or post.created_at)
+    ]
+
+
+def reconcile_post_activity(batch_size=1000):
+    """
+    Recompute the comment activity of all posts, ``batch_size`` posts at a time.
+
+    The comment count is repaired from the comments, while the last activity
+    only moves forward: it is kept when the newest comment is deleted.
+
+    Yields the number of posts repaired per batch.
+    """
+    last_id = 0
+    while True:
+        posts = list(
+            Post.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .annotate(
+                actual_count=Count("comments"),
+                newest_comment_at=Max("comments__created_at"),
+            )
+            .only("id", "created_at", "comment_count", "last_activity_at")[:batch_size]
+        )
+        if not posts:
+            return
+
+        drifted = _drifted(posts)
+        if drifted:
+            with transaction.atomic():
+                # Once locked, comments being added have committed with their
+                # increments; the UPDATE counts them instead of overwriting.
+                list(
+                    Post.objects.select_for_update()
+                    .filter(pk__in=drifted)
+                    .values_list("pk", flat=True)
+                )
+                Post.objects.filter(pk__in=drifted).update(
+                    **_actual_activity(), updated_at=timezone.now()
+                )
+            # Cached responses still show the drifted values.
+            invalidate_posts(drifted)
+
+        last_id = posts[-1].id
+        yield len(drifted)
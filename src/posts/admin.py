@@ -9,7 +9,7 @@ class CommentInline(admin.TabularInline):
 
 
 class PostAdmin(admin.ModelAdmin):
-    list_display = ("title", "user", "created_at")
+    list_display = ("title", "user", "created_at", "comment_count", "last_activity_at")
     inlines = [CommentInline]
 
 
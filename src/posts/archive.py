@@ -0,0 +1,107 @@
+"""
+Cold storage for old posts.
+
+Posts without activity for ``POSTS_ARCHIVE_AFTER_DAYS`` days are moved out of
+the hot tables into ``ArchivedPost``: the post and its whole comment thread are
+serialized once, compressed into a single row and deleted from ``Post`` and
+``Comment``. Lists, timelines and search only ever read the hot tables;
+``PostDetail`` falls back to the archive when a post is not found.
+"""
+
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework import serializers
+
+from posts.models import ArchivedPost, Comment, Post
+from posts.serializers import PostSerializer
+
+ARCHIVE_BATCH_SIZE = 100
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.POSTS_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_posts(cutoff):
+    return Post.objects.filter(last_activity_at__lt=cutoff)
+
+
+def compress_thread(post):
+    """Serialize ``post`` with its comments in thread order and compress it."""
+    data = PostSerializer(post, expand=["comments"]).data
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 9)
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive up to ``batch_size`` posts older than ``cutoff``; returns the count."""
+    comments = Comment.objects.select_related("user").order_by("path")
+    with transaction.atomic():
+        # Lock the posts so no comment is added between reading and deleting.
+        posts = list(
+            archivable_posts(cutoff)
+            .select_related("user")
+            .select_for_update(of=("self",))
+            .prefetch_related(Prefetch("comments", queryset=comments))
+            .order_by("id")[:batch_size]
+        )
+        if not posts:
+            return 0
+
+        ArchivedPost.objects.bulk_create(
+            ArchivedPost(
+                id=post.pk, created_at=post.created_at, thread=compress_thread(post)
+            )
+            for post in posts
+        )
+        # Deleting sends post_delete, which drops the cached responses.
+        Post.objects.filter(pk__in=[post.pk for post in posts]).delete()
+    return len(posts)
+
+
+def archive_posts(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive every post older than ``cutoff``, one batch per transaction."""
+    total = 0
+    while count := archive_batch(cutoff, batch_size):
+        total += count
+    return total
+
+
+def archived_representation(archived, serializer, preview_size=None):
+    """
+    Shape the stored thread of ``archived`` like ``serializer`` would a post.
+
+    Only the fields of ``serializer`` and of its nested serializers are kept,
+    so ``?fields=`` (including ``comments.<field>``) and ``?expand=comments``
+    apply as usual; with ``preview_size`` only the newest comments are kept.
+    """
+    data = archived.load_thread()
+    if preview_size is not None:
+        newest = sorted(
+            data["comments"],
+            key=lambda comment: (comment["created_at"], comment["id"]),
+            reverse=True,
+        )
+        data["comments"] = newest[:preview_size]
+    return _pick_fields(data, serializer)
+
+
+def _pick_fields(data, serializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        return [_pick_fields(item, serializer.child) for item in data]
+    return {
+        name: (
+            _pick_fields(data[name], field)
+            if isinstance(field, serializers.BaseSerializer) and data[name] is not None
+            else data[name]
+        )
+        for name, field in serializer.fields.items()
+        if name in data
+    }
@@ -0,0 +1,60 @@
+from django.http import Http404
+
+from config.async_views import AsyncAPIView
+from config.fastpath import RowMapper
+from config.serializers import split_names
+from posts.archive import archived_representation
+from posts.models import ArchivedPost, Post
+from posts.pagination import PostPagination
+from posts.serializers import PostSerializer
+from posts.views import PostList
+
+
+def post_serializer(request):
+    # Comments are not embedded by the async endpoints.
+    return PostSerializer(
+        fields=split_names(request.query_params.get("fields")), expand=[]
+    )
+
+
+class AsyncPostList(AsyncAPIView):
+    """This class lists posts, like ``PostList``.
+
+    Supports ``?fields=``, ``?ordering=active`` and the keyset pagination of
+    ``PostList`` (``?page_size=`` and the ``next`` links).
+    """
+
+    def get_keyset_ordering(self):
+        return PostList.orderings.get(self.request.query_params.get("ordering"))
+
+    async def get(self, request):
+        mapper = RowMapper.for_serializer(post_serializer(request))
+        paginator = PostPagination()
+        ordering = self.get_keyset_ordering() or paginator.ordering
+        queryset = mapper.values(
+            Post.objects.order_by(*ordering), *[name.lstrip("-") for name in ordering]
+        )
+
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        if page is None:
+            return mapper.map([row async for row in queryset])
+        return {"next": paginator.get_next_link(), "results": mapper.map(page)}
+
+
+class AsyncPostDetail(AsyncAPIView):
+    """This class retrieves a single post, like ``PostDetail``.
+
+    Archived posts are served from the archive.
+    """
+
+    async def get(self, request, pk):
+        serializer = post_serializer(request)
+        mapper = RowMapper.for_serializer(serializer)
+        row = await mapper.values(Post.objects.filter(pk=pk)).afirst()
+        if row is not None:
+            return mapper(row)
+
+        archived = await ArchivedPost.objects.filter(pk=pk).afirst()
+        if archived is None:
+            raise Http404
+        return archived_representation(archived, serializer)
@@ -0,0 +1,106 @@
+"""
+Response cache for the post endpoints.
+
+Cached responses are keyed by a version number: one for the post list and one
+per post. Saving or deleting a post or one of its comments bumps the versions
+it affects, so stale entries are never read again and simply expire.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from config.routers import replica_reads
+
+LIST_VERSION_KEY = "posts:version:list"
+HITS_KEY = "posts:cache:hits"
+MISSES_KEY = "posts:cache:misses"
+
+
+def post_version_key(post_id):
+    return f"posts:version:post:{post_id}"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # A fresh version must not collide with one evicted from the cache.
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def invalidate_post(post_id):
+    """Drop the cached post list and the cached responses of one post."""
+    invalidate_posts([post_id])
+
+
+def invalidate_posts(post_ids):
+    """Drop the cached post list and the cached responses of several posts."""
+    keys = [LIST_VERSION_KEY, *map(post_version_key, post_ids)]
+    _bump(keys)
+    # Bump again on commit: a response cached from a read that ran before the
+    # commit still shows the old data.
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def cache_stats():
+    return {"hits": cache.get(HITS_KEY, 0), "misses": cache.get(MISSES_KEY, 0)}
+
+
+class CachedResponseMixin:
+    """
+    Serve GET requests from the response cache.
+
+    Views implement ``get_cache_version()``. Responses are cached per version,
+    query string and accepted format, and report ``X-Cache: HIT`` or ``MISS``.
+    Misses read from the primary database, never from a replica.
+    """
+
+    cache_timeout = 5 * 60
+
+    def get_cache_version(self):
+        raise NotImplementedError
+
+    def get_cache_key(self):
+        key = repr((self.request.get_full_path(), self.request.META.get("HTTP_ACCEPT")))
+        digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+        return f"posts:response:{self.get_cache_version()}:{digest}"
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_cache_key()
+        data = cache.get(key)
+        if data is not None:
+            _count(HITS_KEY)
+            response = Response(data)
+            response.headers["X-Cache"] = "HIT"
+            return response
+
+        _count(MISSES_KEY)
+        # Fill the cache from the primary: rows read from a lagging replica
+        # would be served under the new version until the entry expires.
+        with replica_reads(False):
+            response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+        response.headers["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,49 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs from a cheap version lookup.
+
+    Views implement ``get_version()`` returning ``(last_modified, token)``,
+    where ``token`` changes whenever the response would. Requests with a
+    matching ``If-None-Match`` or ``If-Modified-Since`` get a 304 without the
+    object graph being loaded or serialized; other responses carry a weak
+    ``ETag`` and ``Last-Modified``.
+    """
+
+    def get_version(self):
+        raise NotImplementedError
+
+    def get_etag(self, token):
+        # The same version renders differently per query string and format.
+        key = repr(
+            (
+                self.request.get_full_path(),
+                self.request.META.get("HTTP_ACCEPT"),
+                token,
+            )
+        )
+        digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+        return f'W/"{digest}"'
+
+    def get(self, request, *args, **kwargs):
+        version = self.get_version()
+        if version is None:
+            return super().get(request, *args, **kwargs)
+
+        last_modified, token = version
+        etag = self.get_etag(token)
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code == 200:
+                response.headers["ETag"] = etag
+                if timestamp is not None:
+                    response.headers["Last-Modified"] = http_date(timestamp)
+        return response
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts.archive import (
+    ARCHIVE_BATCH_SIZE,
+    archivable_posts,
+    archive_cutoff,
+    archive_posts,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move posts without recent activity, with their comment threads, from "
+        "the hot tables into the compressed archive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=None,
+            help="Archive posts inactive for this many days "
+            "(default: POSTS_ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+            help="Number of posts archived per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the posts that would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options["older_than_days"])
+        if options["dry_run"]:
+            count = archivable_posts(cutoff).count()
+            self.stdout.write(f"{count} posts would be archived.")
+            return
+
+        count = archive_posts(cutoff, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {count} posts."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import BACKFILL_LIMIT, backfill_timeline
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Add the newest posts of followed users to home timelines."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Only backfill the timelines of these users (default: everyone).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=BACKFILL_LIMIT,
+            help="Number of posts to load into each timeline.",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        count = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            backfill_timeline(user_id, limit=options["limit"])
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {count} timelines."))
@@ -0,0 +1,69 @@
+import copy
+import importlib.util
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what opening database connections costs per request: "
+        "simulated requests running one query each, with a connection per "
+        "request, a persistent connection and, with psycopg 3, a pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+
+    def handle(self, *args, **options):
+        base = connections[DEFAULT_DB_ALIAS]
+        modes = {
+            "per request": {"CONN_MAX_AGE": 0},
+            "persistent": {"CONN_MAX_AGE": None},
+        }
+        if is_psycopg3 and importlib.util.find_spec("psycopg_pool"):
+            pool = {"min_size": 1, "max_size": 1}
+            modes["pool"] = {
+                "CONN_MAX_AGE": 0,
+                "OPTIONS": {**base.settings_dict["OPTIONS"], "pool": pool},
+            }
+        else:
+            self.stderr.write("psycopg 3 with the pool extra is not installed.")
+
+        results = {}
+        for mode, overrides in modes.items():
+            settings_dict = {**copy.deepcopy(base.settings_dict), **overrides}
+            connection = type(base)(settings_dict)
+            try:
+                results[mode] = self.run(connection, options["requests"])
+            finally:
+                connection.close()
+                if hasattr(connection, "close_pool"):
+                    connection.close_pool()
+
+            seconds, opened = results[mode]
+            self.stdout.write(
+                f"{mode}: {seconds / options['requests'] * 1000:.3f} ms/request, "
+                f"{opened} connections opened"
+            )
+
+        setup = results["per request"][0] - results["persistent"][0]
+        self.stdout.write(
+            f"connection setup: {setup / options['requests'] * 1000:.3f} ms/request"
+        )
+
+    def run(self, connection, count):
+        """Serve ``count`` requests the way Django does; return the time taken
+        and the number of server connections used."""
+        backends = set()
+        start = time.perf_counter()
+        for _ in range(count):
+            # What the request_started and request_finished signals do.
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                backends.add(cursor.fetchone()[0])
+            connection.close_if_unusable_or_obsolete()
+        return time.perf_counter() - start, len(backends)
@@ -0,0 +1,78 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from config.fastpath import RowMapper
+from config.serializers import select_fields
+from posts.models import Comment, Post
+from posts.serializers import CommentSerializer, PostSerializer
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the serializers with the values() row mapper used by the list "
+        "endpoints on synthetic posts and comments: objects serialized per "
+        "second. Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--objects", type=int, default=5000)
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Runs per path; the best counts."
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.build_data(options["objects"])
+            for name, serializer_class, queryset in (
+                ("posts", PostSerializer, Post.objects.filter(user=user)),
+                ("comments", CommentSerializer, Comment.objects.filter(user=user)),
+            ):
+                self.run(name, serializer_class, queryset, options)
+            transaction.set_rollback(True)
+
+    def build_data(self, count):
+        prefix = uuid.uuid4().hex[:8]
+        user = User.objects.bulk_create(
+            [User(username=f"bench-{prefix}", email=f"bench-{prefix}@invalid")]
+        )[0]
+        posts = Post.objects.bulk_create(
+            Post(user=user, title=f"Post {i}", description="Benchmark " * 20)
+            for i in range(count)
+        )
+        Comment.objects.bulk_create(
+            Comment(user=user, post=post, content="Benchmark " * 10) for post in posts
+        )
+        return user
+
+    def run(self, name, serializer_class, queryset, options):
+        serializer = serializer_class()
+        mapper = RowMapper.for_serializer(serializer)
+        queryset = select_fields(queryset, serializer)
+
+        def serialize():
+            return serializer_class(queryset.all(), many=True).data
+
+        def map_rows():
+            return mapper.map(mapper.values(queryset))
+
+        renderer = JSONRenderer()
+        identical = renderer.render(serialize()) == renderer.render(map_rows())
+
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        for path, function in (("serializer", serialize), ("row mapper", map_rows)):
+            best = min(self.measure(function) for _ in range(options["repeat"]))
+            self.stdout.write(
+                f"  {path}: {options['objects'] / best:,.0f} objects/s "
+                f"({best * 1000:.1f} ms)"
+            )
+        self.stdout.write(f"  identical output: {'yes' if identical else 'NO'}")
+
+    def measure(self, function):
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
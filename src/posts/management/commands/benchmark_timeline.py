@@ -0,0 +1,158 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts.models import Post, TimelineEntry
+from posts.timeline import (
+    fan_out_post,
+    high_follower_ids,
+    merge_high_follower_posts,
+    recent_posts_key,
+)
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare fan-out on write with hybrid fan-out on a synthetic follow "
+        "graph: timeline rows written per post and timeline read latency. "
+        "Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument(
+            "--follows", type=int, default=20, help="Regular follows per user."
+        )
+        parser.add_argument(
+            "--hot-authors",
+            type=int,
+            default=5,
+            help="Number of authors followed by most users.",
+        )
+        parser.add_argument(
+            "--hot-ratio",
+            type=float,
+            default=0.8,
+            help="Share of users following each hot author.",
+        )
+        parser.add_argument("--posts", type=int, default=200)
+        parser.add_argument(
+            "--hot-post-ratio",
+            type=float,
+            default=0.2,
+            help="Share of the posts written by hot authors.",
+        )
+        parser.add_argument("--reads", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument(
+            "--threshold",
+            type=int,
+            default=None,
+            help="Follower threshold of the hybrid run (default: half the "
+            "followers of a hot author).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        threshold = options["threshold"]
+        if threshold is None:
+            threshold = int(options["users"] * options["hot_ratio"] / 2)
+
+        with transaction.atomic():
+            user_ids, hot_ids = self.build_graph(rng, options)
+            for name, setting in (
+                ("fan-out on write", None),
+                (f"hybrid (threshold {threshold})", threshold),
+            ):
+                with override_settings(TIMELINE_FANOUT_THRESHOLD=setting):
+                    self.run(name, rng, user_ids, hot_ids, options)
+            transaction.set_rollback(True)
+
+    def build_graph(self, rng, options):
+        prefix = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create(
+            User(username=f"bench-{prefix}-{i}", email=f"bench-{prefix}-{i}@invalid")
+            for i in range(options["users"])
+        )
+        user_ids = [user.id for user in users]
+        hot_ids = user_ids[: options["hot_authors"]]
+        regular_ids = user_ids[options["hot_authors"] :]
+
+        Follow = User.following.through
+        follows = set()
+        for user_id in user_ids:
+            for followed_id in rng.sample(regular_ids, options["follows"]):
+                follows.add((user_id, followed_id))
+            for hot_id in hot_ids:
+                if rng.random() < options["hot_ratio"]:
+                    follows.add((user_id, hot_id))
+        Follow.objects.bulk_create(
+            Follow(from_user_id=from_id, to_user_id=to_id)
+            for from_id, to_id in follows
+            if from_id != to_id
+        )
+        self.stdout.write(
+            f"{len(user_ids)} users, {len(follows)} follows, {len(hot_ids)} hot authors"
+        )
+        return user_ids, hot_ids
+
+    def run(self, name, rng, user_ids, hot_ids, options):
+        TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+        Post.objects.filter(user_id__in=user_ids).delete()
+        cache.delete_many([recent_posts_key(user_id) for user_id in hot_ids])
+        cache.delete(f"timeline:high-follower:{settings.TIMELINE_FANOUT_THRESHOLD}")
+        high_follower_ids()
+
+        # Writes: the same fan-out the post_save handler schedules.
+        written = 0
+        write_times = []
+        for _ in range(options["posts"]):
+            if rng.random() < options["hot_post_ratio"]:
+                author_id = rng.choice(hot_ids)
+            else:
+                author_id = rng.choice(user_ids)
+            post = Post.objects.bulk_create(
+                [Post(user_id=author_id, title="Benchmark", description="...")]
+            )[0]
+            start = time.perf_counter()
+            written += fan_out_post(post.id)
+            write_times.append(time.perf_counter() - start)
+
+        # Reads: the first page of a timeline, as served by TimelineList.
+        limit = options["page_size"]
+        read_times = []
+        for user_id in rng.choices(user_ids, k=options["reads"]):
+            start = time.perf_counter()
+            entries = list(
+                TimelineEntry.objects.filter(user_id=user_id).order_by(
+                    "-created_at", "-post_id"
+                )[:limit]
+            )
+            merge_high_follower_posts(user_id, entries, None, limit)
+            read_times.append(time.perf_counter() - start)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f"  write amplification: {written / options['posts']:.1f} rows/post "
+            f"({written} rows)"
+        )
+        self.stdout.write(f"  write latency: {self.summary(write_times)}")
+        self.stdout.write(f"  read latency:  {self.summary(read_times)}")
+
+    def summary(self, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        return (
+            f"mean {statistics.mean(timings) * 1000:.2f} ms, "
+            f"p50 {statistics.median(timings) * 1000:.2f} ms, "
+            f"p95 {p95 * 1000:.2f} ms"
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from config.export import CHUNK_SIZE, DATASETS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream posts, comments, communications or messages as NDJSON or CSV, "
+        "in id order and with constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+        parser.add_argument(
+            "--after-id",
+            type=int,
+            default=None,
+            help="Resume after the row with this id.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Number of rows fetched from the cursor at a time.",
+        )
+        parser.add_argument(
+            "--output", default=None, help="File to write to (default: stdout)."
+        )
+
+    def handle(self, *args, **options):
+        lines = export_lines(
+            options["dataset"],
+            options["format"],
+            after_id=options["after_id"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["output"] is None:
+            for chunk in lines:
+                self.stdout.write(chunk, ending="")
+            return
+
+        with open(options["output"], "w", newline="") as output:
+            for chunk in lines:
+                output.write(chunk)
+        self.stderr.write(f"Wrote {options['dataset']} to {options['output']}.")
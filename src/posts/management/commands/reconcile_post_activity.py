@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.activity import reconcile_post_activity
+
+
+class Command(BaseCommand):
+    help = "Repair drifted comment counts and last activity times of posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of posts checked per query.",
+        )
+
+    def handle(self, *args, **options):
+        repaired = sum(reconcile_post_activity(batch_size=options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} posts."))
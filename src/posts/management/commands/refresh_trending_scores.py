@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = "Rescore the posts with changed comments or votes since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rescore all posts, e.g. after changing the scoring.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of scores written per query.",
+        )
+
+    def handle(self, *args, **options):
+        scored = refresh_trending_scores(
+            full=options["full"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Scored {scored} posts."))
@@ -0,0 +1,94 @@
+# Generated by Django 5.1 on 2026-10-18 08:51
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+POST_TRIGGER = """
+CREATE FUNCTION posts_post_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('german', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B') ||
+        setweight(to_tsvector('german', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_post_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON posts_post
+    FOR EACH ROW EXECUTE FUNCTION posts_post_search_vector();
+
+UPDATE posts_post SET search_vector = NULL;
+"""
+
+COMMENT_TRIGGER = """
+CREATE FUNCTION posts_comment_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        to_tsvector('english', coalesce(NEW.content, '')) ||
+        to_tsvector('german', coalesce(NEW.content, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_comment_search_vector_update
+    BEFORE INSERT OR UPDATE OF content, search_vector ON posts_comment
+    FOR EACH ROW EXECUTE FUNCTION posts_comment_search_vector();
+
+UPDATE posts_comment SET search_vector = NULL;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0003_timelineentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="comment_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="post_search_idx"
+            ),
+        ),
+        # Django writes search_vector back as NULL on every save(), which
+        # fires the triggers and keeps the vectors current.
+        migrations.RunSQL(
+            POST_TRIGGER,
+            reverse_sql="""
+            DROP TRIGGER posts_post_search_vector_update ON posts_post;
+            DROP FUNCTION posts_post_search_vector();
+            """,
+        ),
+        migrations.RunSQL(
+            COMMENT_TRIGGER,
+            reverse_sql="""
+            DROP TRIGGER posts_comment_search_vector_update ON posts_comment;
+            DROP FUNCTION posts_comment_search_vector();
+            """,
+        ),
+    ]
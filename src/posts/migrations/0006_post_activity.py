@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-18 08:54
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0005_commentvote"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="last_activity_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE posts_post SET last_activity_at = created_at;
+            UPDATE posts_post
+            SET comment_count = activity.comment_count,
+                last_activity_at = GREATEST(posts_post.created_at, activity.newest)
+            FROM (
+                SELECT post_id, COUNT(*) AS comment_count, MAX(created_at) AS newest
+                FROM posts_comment
+                GROUP BY post_id
+            ) AS activity
+            WHERE activity.post_id = posts_post.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["-last_activity_at", "-id"], name="post_activity_idx"
+            ),
+        ),
+    ]
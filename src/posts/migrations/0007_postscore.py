@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-18 08:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0006_post_activity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostScore",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending_score",
+                        serialize=False,
+                        to="posts.post",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("computed_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-score", "-post"], name="post_score_idx")
+                ],
+            },
+        ),
+    ]
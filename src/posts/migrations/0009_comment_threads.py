@@ -0,0 +1,47 @@
+# Generated by Django 5.1 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0008_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="replies",
+                to="posts.comment",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="path",
+            field=models.TextField(db_collation="C", default="", editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        # Existing comments are top-level comments (see posts.models.path_segment).
+        migrations.RunSQL(
+            """
+            UPDATE posts_comment
+            SET path = chr(ascii('a') + length(id::text) - 1) || id::text;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["post", "path"], name="comment_post_path_idx"),
+        ),
+    ]
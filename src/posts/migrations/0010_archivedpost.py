@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0009_comment_threads"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedPost",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("thread", models.BinaryField()),
+            ],
+        ),
+    ]
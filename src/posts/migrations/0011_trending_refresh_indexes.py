@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-18 10:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0010_archivedpost"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["updated_at"], name="comment_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="commentvote",
+            index=models.Index(fields=["created_at"], name="comment_vote_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["updated_at"], name="post_updated_idx"),
+        ),
+    ]
@@ -1,27 +1,278 @@
-from django.db import models
+import json
+import zlib
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, transaction
+from django.utils import timezone
+from config.models import InPlaceFieldsMixin
 from users.models import User
 
 
-class Post(models.Model):
+class Post(InPlaceFieldsMixin, models.Model):
     user = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, related_name="posts"
     )
     title = models.CharField(max_length=255)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Changes whenever the serialized post changes; used for conditional GETs.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Kept up to date when comments are added or removed (see posts.activity).
+    comment_count = models.IntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
+    # English and German lexemes of title and description, kept up to date by
+    # a database trigger (see migration 0004).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    in_place_fields = ("comment_count", "last_activity_at")
+
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination of the post list.
+            models.Index(fields=["-created_at", "-id"], name="post_created_id_idx"),
+            GinIndex(fields=["search_vector"], name="post_search_idx"),
+            # Backs the "active" ordering of the post list.
+            models.Index(fields=["-last_activity_at", "-id"], name="post_activity_idx"),
+            # Find the posts to rescore since the last trending refresh.
+            models.Index(fields=["updated_at"], name="post_updated_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class Comment(models.Model):
+# Replies nested deeper than this are rejected.
+MAX_COMMENT_DEPTH = 32
+
+
+def path_segment(pk):
+    """
+    Encode a comment id for use in a path.
+
+    The digits are prefixed with a letter for their count ("a" for one digit,
+    "b" for two, ...), so segments compare like the ids they encode.
+    """
+    digits = str(pk)
+    return chr(ord("a") + len(digits) - 1) + digits
+
+
+class CommentQuerySet(models.QuerySet):
+    def reserve_ids(self, count):
+        """Draw ``count`` ids from the primary key sequence."""
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+                "FROM generate_series(1, %s)",
+                [self.model._meta.db_table, self.model._meta.pk.column, count],
+            )
+            return [pk for (pk,) in cursor.fetchall()]
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        new = [comment for comment in objs if comment.pk is None]
+        for comment, pk in zip(new, self.reserve_ids(len(new)) if new else []):
+            comment.pk = pk
+            comment.set_path()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def subtree(self, comment, max_depth=None):
+        """
+        Return ``comment`` and all its replies in thread order, down to
+        ``max_depth`` levels below it.
+
+        The paths of a subtree share the path of its root as a prefix, so this
+        is a single range scan of the (post, path) index.
+        """
+        comments = self.filter(
+            post_id=comment.post_id,
+            path__gte=comment.path,
+            path__lt=comment.path + "/",  # "/" follows "." in the C collation.
+        )
+        if max_depth is not None:
+            comments = comments.filter(depth__lte=comment.depth + max_depth)
+        return comments.order_by("path")
+
+    def replies(self, comment):
+        """Return the direct replies to ``comment``, oldest first."""
+        return self.subtree(comment).filter(depth=comment.depth + 1)
+
+
+class Comment(InPlaceFieldsMixin, models.Model):
     user = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, related_name="comments"
     )
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Changes whenever the serialized comment changes; used for conditional GETs.
+    updated_at = models.DateTimeField(auto_now=True)
     upvotes = models.IntegerField(default=0)
+    # English and German lexemes of content, kept up to date by a database
+    # trigger (see migration 0004).
+    search_vector = SearchVectorField(null=True, editable=False)
+    # The comment this one replies to, if any. path holds the encoded ids of
+    # all ancestors and the comment itself, joined by "." (see path_segment),
+    # so that ordering by path lists every reply right after its parent.
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="replies",
+    )
+    path = models.TextField(db_collation="C", editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
+    # Counted by CommentVoteView.
+    in_place_fields = ("upvotes",)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="comment_search_idx"),
+            # Answers "has any comment of this post changed" from the index.
+            models.Index(
+                fields=["post", "updated_at"], name="comment_post_updated_idx"
+            ),
+            # Backs thread order and subtree range scans.
+            models.Index(fields=["post", "path"], name="comment_post_path_idx"),
+            models.Index(fields=["updated_at"], name="comment_updated_idx"),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user} on {self.post}"
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        # The comment commits together with the activity of its post, updated
+        # by the post_save handlers; see posts.activity.
+        if self._state.adding and self.pk is None:
+            # The path ends with the comment's own id, so draw it up front.
+            self.pk = Comment.objects.reserve_ids(1)[0]
+            self.set_path()
+            kwargs["force_insert"] = True
+        super().save(*args, **kwargs)
+
+    def set_path(self):
+        segment = path_segment(self.pk)
+        if self.parent_id is None:
+            self.path = segment
+            self.depth = 0
+        else:
+            self.path = f"{self.parent.path}.{segment}"
+            self.depth = self.parent.depth + 1
+
+
+class CommentVote(models.Model):
+    """
+    An upvote of a comment. Each user can upvote a comment once; the total is
+    kept in Comment.upvotes.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="comment_votes",
+        # Covered by the unique constraint below.
+        db_index=False,
+    )
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name="votes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "comment"], name="unique_comment_vote"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="comment_vote_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Upvote by {self.user} on {self.comment_id}"
+
+
+class PostScore(models.Model):
+    """
+    The precomputed trending score of a post, refreshed by the
+    refresh_trending_scores command (see posts.trending).
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending_score",
+    )
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score", "-post"], name="post_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post} scores {self.score:.3f}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A post materialized into the home timeline of one of its author's followers.
+
+    Entries are written when a post is created (fan-out on write), so reading a
+    timeline is a range scan over a single user's entries.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        # Covered by the unique constraint below.
+        db_index=False,
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    # Copy of post.created_at, so the timeline can be ordered without a join.
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_entry"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-post"],
+                name="timeline_user_created_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.post} in timeline of {self.user}"
+
+
+class ArchivedPost(models.Model):
+    """
+    A post moved out of the hot tables by the archive_posts command.
+
+    The post and its whole comment thread are kept as one zlib-compressed JSON
+    document, in the shape PostDetail serves with ``?expand=comments``.
+    """
+
+    # The id of the archived post.
+    id = models.BigIntegerField(primary_key=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    thread = models.BinaryField()
+
+    def load_thread(self):
+        return json.loads(zlib.decompress(self.thread))
+
+    def __str__(self):
+        return f"Archived post {self.id}"
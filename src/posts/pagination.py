@@ -0,0 +1,237 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import date, datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from posts.timeline import merge_high_follower_posts
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate a queryset by seeking past the last row of the previous page.
+
+    The position of a page is an opaque cursor holding the values of the
+    ``ordering`` fields of the last row served. The next page is selected with
+    a ``(a, b) < (x, y)`` style filter instead of an OFFSET, so a deep page
+    costs the same index range scan as the first one. The last ordering field
+    must be unique (usually the primary key) to keep the ordering total.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+    # Only paginate when the client sends one of the query parameters above,
+    # so endpoints that used to return a plain list keep doing so.
+    opt_in = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.opt_in and not self.is_requested(request):
+            return None
+
+        position = self.start_page(queryset, request, view)
+        # Fetch one extra row to find out whether there is a next page.
+        return self.end_page(self.fetch(queryset, position, self.page_size + 1))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Like ``paginate_queryset()``, reading the rows with the async ORM."""
+        if self.opt_in and not self.is_requested(request):
+            return None
+
+        position = self.start_page(queryset, request, view)
+        return self.end_page(await self.afetch(queryset, position, self.page_size + 1))
+
+    def start_page(self, queryset, request, view):
+        """Read the page parameters and return the position to start after."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+        return self.decode_cursor(request, queryset.model)
+
+    def end_page(self, rows):
+        self.page = rows[: self.page_size]
+        self.next_position = None
+        if len(rows) > self.page_size:
+            self.next_position = self.get_position(self.page[-1])
+        return self.page
+
+    def fetch(self, queryset, position, limit):
+        """Return the first ``limit`` rows after ``position``."""
+        return list(self.seek_queryset(queryset, position)[:limit])
+
+    async def afetch(self, queryset, position, limit):
+        return [row async for row in self.seek_queryset(queryset, position)[:limit]]
+
+    def seek_queryset(self, queryset, position):
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek(position))
+        return queryset
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def get_ordering(self, view):
+        # Views may pick one of several indexed orderings per request.
+        ordering = None
+        if hasattr(view, "get_keyset_ordering"):
+            ordering = view.get_keyset_ordering()
+        return ordering or self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def get_position(self, obj):
+        """Return the values of the ordering fields for ``obj``."""
+        if isinstance(obj, dict):
+            # A values() row.
+            return [obj[name.lstrip("-")] for name in self.ordering]
+        return [getattr(obj, name.lstrip("-")) for name in self.ordering]
+
+    def seek(self, position):
+        """
+        Build the filter selecting the rows strictly after ``position``.
+
+        For an ordering ``(-a, -b)`` this is ``a < x OR (a = x AND b < y)``.
+        The redundant ``a <= x`` in front gives the planner a plain range
+        condition on the leading index column.
+        """
+        condition = None
+        for name, value in reversed(list(zip(self.ordering, position))):
+            lookup = "lt" if name.startswith("-") else "gt"
+            name = name.lstrip("-")
+            after = Q(**{f"{name}__{lookup}": value})
+            if condition is not None:
+                after |= Q(**{name: value}) & condition
+            condition = after
+
+        first = self.ordering[0]
+        lookup = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{lookup}": position[0]}) & condition
+
+    def encode_cursor(self, position):
+        values = [
+            value.isoformat() if isinstance(value, (date, datetime)) else value
+            for value in position
+        ]
+        payload = json.dumps(values, separators=(",", ":")).encode()
+        return urlsafe_b64encode(payload).decode().rstrip("=")
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            payload = urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            values = json.loads(payload)
+        except (BinasciiError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        position = []
+        for name, value in zip(self.ordering, values):
+            # Cursors only hold plain values, never null: the ordering fields
+            # are not nullable.
+            if not isinstance(value, (str, int, float)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                field = model._meta.get_field(name.lstrip("-"))
+            except FieldDoesNotExist:
+                # Annotations are compared as they are.
+                position.append(value)
+                continue
+            try:
+                value = field.to_python(value)
+            except (ValidationError, TypeError, ValueError, KeyError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            position.append(value)
+        return position
+
+
+class PostPagination(KeysetPagination):
+    """Newest posts first; opt in with ``?page_size=`` or ``?cursor=``."""
+
+    ordering = ("-created_at", "-id")
+    opt_in = True
+
+
+class ThreadPagination(KeysetPagination):
+    """Comments in thread order; opt in with ``?page_size=`` or ``?cursor=``."""
+
+    ordering = ("path",)
+    opt_in = True
+
+
+class ReplyPagination(KeysetPagination):
+    """Replies to a comment, oldest first; replies are always paginated."""
+
+    ordering = ("path",)
+
+
+class SearchPagination(KeysetPagination):
+    """Best matches first; search results are always paginated."""
+
+    ordering = ("-rank", "-id")
+
+
+class TrendingPagination(KeysetPagination):
+    """Highest scores first; the trending list is always paginated."""
+
+    ordering = ("-score", "-post_id")
+
+
+class TimelinePagination(KeysetPagination):
+    """
+    Newest timeline entries first; home timelines are always paginated.
+
+    Posts of followed high-follower authors are merged into each page.
+    """
+
+    ordering = ("-created_at", "-post_id")
+
+    def fetch(self, queryset, position, limit):
+        entries = super().fetch(queryset, position, limit)
+        return merge_high_follower_posts(self.request.user.id, entries, position, limit)
@@ -1,24 +1,104 @@
 from rest_framework import serializers
+from config.serializers import FlexFieldsMixin
 from posts.models import Post
-from posts.models import Comment
+from posts.models import Comment, MAX_COMMENT_DEPTH
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Create all items of a list with ``bulk_create``.
+
+    ``bulk_create`` sends no ``post_save`` signals; callers take care of the
+    side effects of the signal handlers.
+    """
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        return model.objects.bulk_create([model(**attrs) for attrs in validated_data])
+
+
+class CommentSerializer(FlexFieldsMixin, serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source="user.username")
     post = serializers.PrimaryKeyRelatedField(
         queryset=Post.objects.all(), write_only=True
     )
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.all(), required=False, allow_null=True
+    )
 
     class Meta:
         model = Comment
-        fields = ["id", "user", "post", "content", "created_at", "upvotes"]
+        fields = [
+            "id",
+            "user",
+            "post",
+            "parent",
+            "depth",
+            "content",
+            "created_at",
+            "upvotes",
+        ]
+        # Upvotes only change through the vote endpoint.
+        read_only_fields = ["upvotes"]
+        list_serializer_class = BulkListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # A comment stays on its post, with its replies.
+            del fields["post"]
+        elif "post" in self.context:
+            # The view already looked up the post; items need not repeat it.
+            fields["post"] = serializers.HiddenField(default=self.context["post"])
+        return fields
 
+    def validate(self, data):
+        parent = data.get("parent")
+        if self.instance is not None:
+            if "parent" in data and parent != self.instance.parent:
+                raise serializers.ValidationError(
+                    {"parent": "Replies cannot be moved."}
+                )
+        elif parent is not None:
+            if parent.post_id != data["post"].id:
+                raise serializers.ValidationError(
+                    {"parent": "The parent comment belongs to another post."}
+                )
+            if parent.depth >= MAX_COMMENT_DEPTH:
+                raise serializers.ValidationError(
+                    {"parent": "Replies cannot be nested any deeper."}
+                )
+        return data
 
-class PostSerializer(serializers.ModelSerializer):
+
+class PostSerializer(FlexFieldsMixin, serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source="user.username")
-    comments = CommentSerializer(many=True, read_only=True)
 
     class Meta:
         model = Post
-        fields = ["id", "user", "title", "description", "created_at", "comments"]
-        expandable_fields = {"comments": (CommentSerializer,)}
+        fields = [
+            "id",
+            "user",
+            "title",
+            "description",
+            "created_at",
+            "comment_count",
+            "last_activity_at",
+            "comments",
+        ]
+        read_only_fields = ["comment_count", "last_activity_at"]
+        # Comments are only embedded with ?expand=comments.
+        expandable_fields = {
+            "comments": (CommentSerializer, {"many": True, "read_only": True})
+        }
+        list_serializer_class = BulkListSerializer
+
+
+class PostPreviewSerializer(PostSerializer):
+    """Post with only its newest comments embedded."""
+
+    comments = CommentSerializer(source="preview_comments", many=True, read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        # Asking for the preview expands it.
+        expandable_fields = {}
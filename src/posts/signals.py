@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts.activity import comment_added, comment_removed
+from posts.cache import invalidate_post
+from posts.models import Comment, Post
+from posts.timeline import schedule_fan_out
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    """Copy a new post into the timelines of its author's followers."""
+    if created and not raw:
+        schedule_fan_out(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        comment_added(instance.post_id, instance.created_at)
+
+
+@receiver(post_delete, sender=Comment)
+def count_removed_comment(sender, instance, origin=None, **kwargs):
+    # Nothing to count when the comment goes away together with its post.
+    if getattr(origin, "model", type(origin)) is Post:
+        return
+    comment_removed(instance.post_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_cached_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_post(instance.post_id)
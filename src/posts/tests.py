@@ -1,9 +1,33 @@
+import csv
+import json
+from base64 import urlsafe_b64encode
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import AsyncClient, override_settings
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from users.models import User
-from posts.models import Post, Comment
-from rest_framework_simplejwt.tokens import RefreshToken
+from posts import activity
+from posts.models import (
+    ArchivedPost,
+    Comment,
+    CommentVote,
+    Post,
+    PostScore,
+    TimelineEntry,
+)
+from posts.serializers import CommentSerializer, PostPreviewSerializer, PostSerializer
+from config.fastpath import RowMapper
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 
 class PostTests(APITestCase):
@@ -51,6 +75,97 @@ class PostTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
 
+    def test_post_list_sparse_fields_and_expand(self):
+        Comment.objects.create(user=self.user2, post=self.post1, content="Hi")
+        self.set_jwt_authentication(self.user1)
+
+        response = self.client.get(self.post_list_url)
+        self.assertNotIn("comments", response.data[0])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.post_list_url + "?fields=id,title")
+        self.assertEqual(set(response.data[0]), {"id", "title"})
+        self.assertNotIn('"description"', queries[-1]["sql"])
+
+        url = self.post_list_url + "?fields=id,comments.content&expand=comments"
+        # The user, the posts and their comments.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        post = next(post for post in response.data if post["id"] == self.post1.id)
+        self.assertEqual(post, {"id": self.post1.id, "comments": [{"content": "Hi"}]})
+
+    def test_row_mapper_matches_serializers(self):
+        Comment.objects.create(user=self.user2, post=self.post1, content="Hi")
+        # The author deleted their account.
+        orphan = Post.objects.create(user=None, title="Orphan", description="")
+        Comment.objects.create(user=None, post=orphan, content="Gone")
+        renderer = JSONRenderer()
+        for serializer_class, queryset in (
+            (PostSerializer, Post.objects.all()),
+            (CommentSerializer, Comment.objects.all()),
+        ):
+            mapper = RowMapper.for_serializer(serializer_class())
+            self.assertEqual(
+                renderer.render(mapper.map(mapper.values(queryset))),
+                renderer.render(serializer_class(queryset, many=True).data),
+            )
+        # Nested comments need the serializer.
+        self.assertIsNone(RowMapper.for_serializer(PostPreviewSerializer()))
+
+    def test_post_list_cursor_pagination(self):
+        for i in range(5):
+            Post.objects.create(
+                user=self.user1, title=f"Post {i}", description="Paginated post"
+            )
+        self.set_jwt_authentication(self.user1)
+
+        seen = []
+        url = self.post_list_url + "?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            seen.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(
+            Post.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_post_list_invalid_cursor(self):
+        self.set_jwt_authentication(self.user1)
+        response = self.client.get(self.post_list_url + "?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Valid JSON, but not values of the ordering fields.
+        for values in ([[1], {"id": 1}], [None, 1], ["2024-01-01T00:00:00", "x"]):
+            payload = json.dumps(values).encode()
+            cursor = urlsafe_b64encode(payload).decode().rstrip("=")
+            response = self.client.get(self.post_list_url, {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_post_list_comment_preview(self):
+        for i in range(5):
+            Comment.objects.create(
+                user=self.user2, post=self.post1, content=f"Comment {i}"
+            )
+        self.set_jwt_authentication(self.user1)
+
+        # One query for the user, one for the posts, one for all previews.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.post_list_url + "?comments=preview")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        posts = {post["id"]: post for post in response.data}
+        self.assertEqual(posts[self.post1.id]["comment_count"], 5)
+        self.assertEqual(
+            [comment["content"] for comment in posts[self.post1.id]["comments"]],
+            ["Comment 4", "Comment 3", "Comment 2"],
+        )
+        self.assertEqual(posts[self.post2.id]["comment_count"], 0)
+        self.assertEqual(posts[self.post2.id]["comments"], [])
+
     def test_post_detail_as_author(self):
         # Authenticate the client with JWT
         self.set_jwt_authentication(self.user1)
@@ -78,6 +193,38 @@ class PostTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Post.objects.count(), 3)
 
+    def test_post_detail_conditional_get(self):
+        self.set_jwt_authentication(self.user2)
+        response = self.client.get(self.post1_detail_url)
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.post1_detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(
+            self.post1_detail_url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Other representations of the same post have their own tag.
+        response = self.client.get(
+            self.post1_detail_url + "?comments=preview", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        comment = Comment.objects.create(
+            user=self.user2, post=self.post1, content="New comment"
+        )
+        response = self.client.get(self.post1_detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response.headers["ETag"]
+        comment.content = "Edited comment"
+        comment.save()
+        response = self.client.get(self.post1_detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_update_post_as_author(self):
         # Authenticate the client with JWT
         self.set_jwt_authentication(self.user1)
@@ -206,6 +353,279 @@ class CommentTests(APITestCase):
         # Only comment2 should remain
         self.assertEqual(Comment.objects.count(), 1)
 
+    def test_upvote_comment_once_per_user(self):
+        vote_url = reverse("posts:comment-vote", args=[self.post.id, self.comment1.id])
+        self.set_jwt_authentication(self.user2)
+
+        response = self.client.post(vote_url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"upvotes": 1, "voted": True})
+        # Voting again changes nothing.
+        response = self.client.post(vote_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["upvotes"], 1)
+
+        self.set_jwt_authentication(self.user1)
+        response = self.client.post(vote_url)
+        self.assertEqual(response.data["upvotes"], 2)
+
+        response = self.client.delete(vote_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"upvotes": 1, "voted": False})
+        response = self.client.delete(vote_url)
+        self.assertEqual(response.data["upvotes"], 1)
+
+    def test_upvote_missing_comment(self):
+        self.set_jwt_authentication(self.user1)
+        other_post = Post.objects.create(user=self.user1, title="Other", description="")
+        response = self.client.post(
+            reverse("posts:comment-vote", args=[other_post.id, self.comment1.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_comment_cannot_change_post(self):
+        other_post = Post.objects.create(user=self.user1, title="Other", description="")
+        self.set_jwt_authentication(self.user1)
+        data = {"content": "Updated comment", "post": other_post.id}
+        response = self.client.put(self.comment1_detail_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.comment1.refresh_from_db()
+        self.assertEqual(self.comment1.post, self.post)
+        other_post.refresh_from_db()
+        self.assertEqual(other_post.comment_count, 0)
+
+    def test_update_comment_cannot_change_upvotes(self):
+        self.set_jwt_authentication(self.user1)
+        data = {"content": "Updated comment", "post": self.post.id, "upvotes": 100}
+        response = self.client.put(self.comment1_detail_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.comment1.refresh_from_db()
+        self.assertEqual(self.comment1.upvotes, 0)
+
+    def test_comment_edit_keeps_concurrent_votes(self):
+        update = CommentSerializer.update
+
+        def update_after_vote(serializer, instance, validated_data):
+            # An upvote lands after the view loaded the comment.
+            CommentVote.objects.create(user=self.user2, comment=instance)
+            Comment.objects.filter(pk=instance.pk).update(upvotes=F("upvotes") + 1)
+            return update(serializer, instance, validated_data)
+
+        self.set_jwt_authentication(self.user1)
+        with patch.object(CommentSerializer, "update", update_after_vote):
+            response = self.client.patch(
+                self.comment1_detail_url, {"content": "Edited"}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.comment1.refresh_from_db()
+        self.assertEqual(self.comment1.content, "Edited")
+        self.assertEqual(self.comment1.upvotes, 1)
+
+    def test_comment_activity_is_counted(self):
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.last_activity_at, self.comment2.created_at)
+
+        self.set_jwt_authentication(self.user1)
+        data = {"content": "New comment", "post": self.post.id}
+        response = self.client.post(self.comment_list_url, data, format="json")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(
+            self.post.last_activity_at,
+            Comment.objects.get(pk=response.data["id"]).created_at,
+        )
+
+        self.client.delete(self.comment1_detail_url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_post_edit_keeps_concurrent_activity(self):
+        update = PostSerializer.update
+
+        def update_after_new_comment(serializer, instance, validated_data):
+            # A comment arrives after the view loaded the post.
+            Comment.objects.create(user=self.user2, post=self.post, content="New")
+            return update(serializer, instance, validated_data)
+
+        self.set_jwt_authentication(self.user1)
+        with patch.object(PostSerializer, "update", update_after_new_comment):
+            response = self.client.patch(
+                reverse("posts:post-detail", args=[self.post.id]),
+                {"title": "Edited"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, "Edited")
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(
+            self.post.last_activity_at, self.post.comments.latest("id").created_at
+        )
+
+    def test_bulk_create_comments(self):
+        self.set_jwt_authentication(self.user2)
+        bulk_url = reverse("posts:comment-bulk-create", args=[self.post.id])
+        data = [{"content": f"Comment {i}"} for i in range(3)]
+        # The user, the post, the ids, the insert and the post's activity, plus
+        # a savepoint and its release: the same for any number of comments.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(7):
+            response = self.client.post(bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [comment["content"] for comment in response.data],
+            ["Comment 0", "Comment 1", "Comment 2"],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 5)
+        self.assertEqual(
+            self.post.last_activity_at,
+            Comment.objects.get(pk=response.data[-1]["id"]).created_at,
+        )
+
+        # One invalid item rejects the whole array.
+        data = [{"content": "Fine", "post": self.post.id}, {"post": self.post.id}]
+        response = self.client.post(bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("content", response.data[1])
+        self.assertEqual(Comment.objects.count(), 5)
+
+    def test_threaded_replies(self):
+        self.set_jwt_authentication(self.user2)
+        data = {"content": "Reply", "post": self.post.id, "parent": self.comment1.id}
+        response = self.client.post(self.comment_list_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["depth"], 1)
+        reply = Comment.objects.get(pk=response.data["id"])
+        nested = Comment.objects.create(
+            user=self.user1, post=self.post, parent=reply, content="Nested"
+        )
+
+        # Every reply follows its parent.
+        response = self.client.get(self.comment_list_url)
+        self.assertEqual(
+            [comment["id"] for comment in response.data],
+            [self.comment1.id, reply.id, nested.id, self.comment2.id],
+        )
+
+        thread_url = reverse("posts:comment-thread", args=[self.post.id, reply.id])
+        # The user, the root comment and its subtree.
+        with self.assertNumQueries(3):
+            response = self.client.get(thread_url)
+        self.assertEqual([c["id"] for c in response.data], [reply.id, nested.id])
+        response = self.client.get(thread_url + "?max_depth=0")
+        self.assertEqual([c["id"] for c in response.data], [reply.id])
+
+        replies_url = reverse(
+            "posts:comment-replies", args=[self.post.id, self.comment1.id]
+        )
+        response = self.client.get(replies_url)
+        self.assertEqual([c["id"] for c in response.data["results"]], [reply.id])
+
+        other_post = Post.objects.create(user=self.user1, title="Other", description="")
+        data = {"content": "Reply", "post": other_post.id, "parent": self.comment1.id}
+        response = self.client.post(
+            reverse("posts:comment-list", args=[other_post.id]), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # The post of the URL counts, not the one in the body.
+        data = {"content": "Reply", "post": self.post.id, "parent": self.comment1.id}
+        response = self.client.post(
+            reverse("posts:comment-list", args=[other_post.id]), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(other_post.comments.exists())
+        data = {"content": "Top", "post": self.post.id}
+        response = self.client.post(
+            reverse("posts:comment-list", args=[other_post.id]), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Comment.objects.get(pk=response.data["id"]).post, other_post)
+
+    def test_reconcile_post_activity(self):
+        Post.objects.update(comment_count=7, last_activity_at=self.post.created_at)
+        self.set_jwt_authentication(self.user1)
+        detail_url = reverse("posts:post-detail", args=[self.post.id])
+        self.client.get(detail_url)
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        etag = response["ETag"]
+
+        call_command("reconcile_post_activity", "--batch-size=1", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.last_activity_at, self.comment2.created_at)
+
+        # The cached response and its ETag do not outlive the repair.
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["comment_count"], 2)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_reconcile_keeps_concurrent_comments(self):
+        Post.objects.update(comment_count=7)
+        drifted = activity._drifted
+
+        def drifted_then_comment(posts):
+            # A comment is added after the counts were checked.
+            Comment.objects.create(user=self.user2, post=self.post, content="Late")
+            return drifted(posts)
+
+        with patch("posts.activity._drifted", drifted_then_comment):
+            self.assertEqual(list(activity.reconcile_post_activity()), [1])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(
+            self.post.last_activity_at, self.post.comments.latest("id").created_at
+        )
+
+    def test_reconcile_keeps_last_activity_of_removed_comments(self):
+        self.comment2.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_activity_at, self.comment2.created_at)
+        self.assertEqual(list(activity.reconcile_post_activity()), [0])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_activity_at, self.comment2.created_at)
+
+    def test_post_list_active_ordering(self):
+        quiet_post = Post.objects.create(
+            user=self.user2, title="Quiet post", description="No comments here"
+        )
+        self.set_jwt_authentication(self.user1)
+
+        response = self.client.get(reverse("posts:post-list") + "?ordering=active")
+        self.assertEqual(
+            [post["id"] for post in response.data], [quiet_post.id, self.post.id]
+        )
+
+        Comment.objects.create(user=self.user2, post=self.post, content="Bump")
+        response = self.client.get(
+            reverse("posts:post-list") + "?ordering=active&page_size=1"
+        )
+        self.assertEqual(response.data["results"][0]["id"], self.post.id)
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.data["results"][0]["id"], quiet_post.id)
+
+    def test_comment_list_conditional_get(self):
+        self.set_jwt_authentication(self.user1)
+        response = self.client.get(self.comment_list_url)
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        # Only the user and the comment version are looked up.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.comment_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(
+            reverse("posts:comment-vote", args=[self.post.id, self.comment1.id])
+        )
+        response = self.client.get(self.comment_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
     def test_delete_comment_as_non_author(self):
         # Authenticate the client with JWT
         self.set_jwt_authentication(self.user2)
@@ -213,3 +633,487 @@ class CommentTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         # user2 cannot delete comment1
         self.assertEqual(Comment.objects.count(), 2)
+
+
+@override_settings(TIMELINE_FANOUT_ASYNC=False)
+class TimelineTests(APITestCase):
+    """Test the home timeline"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author",
+            password="testpassword",
+            email="author@mail.com",
+        )
+        self.follower = User.objects.create_user(
+            username="follower",
+            password="testpassword",
+            email="follower@mail.com",
+        )
+        self.stranger = User.objects.create_user(
+            username="stranger",
+            password="testpassword",
+            email="stranger@mail.com",
+        )
+        self.follower.following.add(self.author)
+        self.timeline_url = reverse("posts:timeline")
+        cache.clear()
+
+    def set_jwt_authentication(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + str(refresh.access_token)
+        )
+
+    def create_post(self, user, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(user=user, title=title, description="...")
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        post = self.create_post(self.author, "Hello followers")
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.follower, post=post).exists()
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.stranger).exists())
+
+    def test_bulk_created_posts_are_fanned_out(self):
+        self.set_jwt_authentication(self.author)
+        data = [{"title": f"Post {i}", "description": "..."} for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("posts:post-bulk-create"), data, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(user=self.follower).values_list(
+                    "post_id", flat=True
+                )
+            ),
+            {post["id"] for post in response.data},
+        )
+
+    def test_timeline_is_paginated_newest_first(self):
+        posts = [self.create_post(self.author, f"Post {i}") for i in range(5)]
+        self.create_post(self.stranger, "Not followed")
+        self.set_jwt_authentication(self.follower)
+
+        seen = []
+        url = self.timeline_url + "?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(post["title"] for post in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, [post.title for post in reversed(posts)])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0, TIMELINE_RECENT_POSTS=2)
+    def test_high_follower_posts_are_merged_at_read_time(self):
+        # With a threshold of 0 the author counts as a high-follower account.
+        posts = [self.create_post(self.author, f"Post {i}") for i in range(3)]
+        self.assertFalse(TimelineEntry.objects.filter(user=self.follower).exists())
+
+        # The materialized post of a regular author is merged with them.
+        self.follower.following.add(self.stranger)
+        with override_settings(TIMELINE_FANOUT_THRESHOLD=None):
+            regular = self.create_post(self.stranger, "Regular post")
+        cache.clear()
+        self.assertTrue(TimelineEntry.objects.filter(user=self.follower).exists())
+
+        self.set_jwt_authentication(self.follower)
+        seen = []
+        url = self.timeline_url + "?page_size=1"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(post["title"] for post in response.data["results"])
+            url = response.data["next"]
+
+        # Deeper pages than the two cached posts come from the post table.
+        expected = [regular] + list(reversed(posts))
+        self.assertEqual(seen, [post.title for post in expected])
+
+    def test_backfill_and_rebuild_timelines(self):
+        # Posts created before following someone are only added by a backfill.
+        post = Post.objects.create(
+            user=self.stranger, title="Old post", description="..."
+        )
+        self.follower.following.add(self.stranger)
+
+        call_command("backfill_timelines", "follower", stdout=StringIO())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.follower, post=post).exists()
+        )
+
+        self.follower.following.remove(self.stranger)
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertFalse(TimelineEntry.objects.filter(user=self.follower).exists())
+
+
+class PostSearchTests(APITestCase):
+    """Test the post search"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser1",
+            password="testpassword",
+            email="test_user1@mail.com",
+        )
+        self.housing = Post.objects.create(
+            user=self.user,
+            title="Wohnungssuche in Berlin",
+            description="Wir suchen seit Monaten neue Häuser.",
+        )
+        self.paperwork = Post.objects.create(
+            user=self.user,
+            title="Registering your address",
+            description="Tips for running errands at the Bürgeramt.",
+        )
+        self.other = Post.objects.create(
+            user=self.user, title="Football on Sunday", description="Who joins?"
+        )
+        Comment.objects.create(
+            user=self.user, post=self.other, content="Bring your residence permit"
+        )
+        self.search_url = reverse("posts:post-search")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + str(refresh.access_token)
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.search_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["id"] for post in response.data["results"]]
+
+    def test_search_stems_english_and_german(self):
+        self.assertEqual(self.search(q="run"), [self.paperwork.id])
+        self.assertEqual(self.search(q="Haus", lang="de"), [self.housing.id])
+
+    def test_search_matches_comments(self):
+        self.assertEqual(self.search(q="permits"), [self.other.id])
+
+    def test_search_ranks_title_matches_first(self):
+        Post.objects.create(
+            user=self.user, title="Something else", description="My address changed"
+        )
+        self.assertEqual(self.search(q="address")[0], self.paperwork.id)
+
+    def test_search_is_paginated(self):
+        for i in range(3):
+            Post.objects.create(user=self.user, title=f"Berlin {i}", description="")
+        response = self.client.get(self.search_url, {"q": "Berlin", "page_size": 2})
+        self.assertEqual(len(response.data["results"]), 2)
+
+        seen = [post["id"] for post in response.data["results"]]
+        response = self.client.get(response.data["next"])
+        seen += [post["id"] for post in response.data["results"]]
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_search_requires_query(self):
+        response = self.client.get(self.search_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TrendingTests(APITestCase):
+    """Test the trending posts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser1",
+            password="testpassword",
+            email="test_user1@mail.com",
+        )
+        self.old = Post.objects.create(user=self.user, title="Old", description="")
+        self.new = Post.objects.create(user=self.user, title="New", description="")
+        self.trending_url = reverse("posts:trending")
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + str(refresh.access_token)
+        )
+
+    def trending_titles(self):
+        response = self.client.get(self.trending_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["title"] for post in response.data["results"]]
+
+    def test_engagement_outweighs_age(self):
+        call_command("refresh_trending_scores", stdout=StringIO())
+        self.assertEqual(self.trending_titles(), ["New", "Old"])
+
+        for i in range(20):
+            Comment.objects.create(user=self.user, post=self.old, content=f"{i}")
+        call_command("refresh_trending_scores", stdout=StringIO())
+        self.assertEqual(self.trending_titles(), ["Old", "New"])
+
+    def test_refresh_only_rescores_recent_activity(self):
+        call_command("refresh_trending_scores", stdout=StringIO())
+        comment = Comment.objects.create(user=self.user, post=self.old, content="Hi")
+
+        stdout = StringIO()
+        call_command("refresh_trending_scores", stdout=stdout)
+        self.assertIn("Scored 1 posts", stdout.getvalue())
+
+        # Votes count as activity too.
+        CommentVote.objects.create(user=self.user, comment=comment)
+        stdout = StringIO()
+        call_command("refresh_trending_scores", stdout=stdout)
+        self.assertIn("Scored 1 posts", stdout.getvalue())
+
+    def test_refresh_lowers_scores_of_removed_engagement(self):
+        comments = [
+            Comment.objects.create(user=self.user, post=self.old, content=f"{i}")
+            for i in range(20)
+        ]
+        vote_url = reverse("posts:comment-vote", args=[self.old.id, comments[0].id])
+        self.client.post(vote_url)
+        call_command("refresh_trending_scores", stdout=StringIO())
+        self.assertEqual(self.trending_titles(), ["Old", "New"])
+        voted_score = PostScore.objects.get(post=self.old).score
+
+        # Withdrawn votes and removed comments are rescored without --full.
+        self.client.delete(vote_url)
+        call_command("refresh_trending_scores", stdout=StringIO())
+        self.assertLess(PostScore.objects.get(post=self.old).score, voted_score)
+
+        self.old.comments.all().delete()
+        call_command("refresh_trending_scores", stdout=StringIO())
+        self.assertEqual(self.trending_titles(), ["New", "Old"])
+
+        self.new.delete()
+        self.assertEqual(self.trending_titles(), ["Old"])
+
+
+class PostCacheTests(APITestCase):
+    """Test the post response cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser1",
+            password="testpassword",
+            email="test_user1@mail.com",
+        )
+        self.post = Post.objects.create(user=self.user, title="Post", description="")
+        self.list_url = reverse("posts:post-list")
+        self.detail_url = reverse("posts:post-detail", kwargs={"pk": self.post.pk})
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + str(refresh.access_token)
+        )
+
+    def test_repeated_reads_are_cached(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        with self.assertNumQueries(2):
+            # Only the user and the conditional GET version are read.
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["title"], "Post")
+
+    def test_changes_invalidate_cached_responses(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, post=self.post, content="Hi")
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data[0]["comment_count"], 1)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["comment_count"], 1)
+
+    def test_cache_stats_are_staff_only(self):
+        self.client.get(self.list_url)
+        self.client.get(self.list_url)
+        stats_url = reverse("posts:post-cache-stats")
+        response = self.client.get(stats_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(stats_url)
+        self.assertEqual(response.data, {"hits": 1, "misses": 1})
+
+
+class ExportTests(APITestCase):
+    """Test the streaming data exports"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser1",
+            password="testpassword",
+            email="test_user1@mail.com",
+        )
+        self.posts = [
+            Post.objects.create(user=self.user, title=f"Post {i}", description="...")
+            for i in range(3)
+        ]
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + str(refresh.access_token)
+        )
+
+    def test_export_command_resumes_after_id(self):
+        stdout = StringIO()
+        call_command(
+            "export_data",
+            "posts",
+            f"--after-id={self.posts[0].id}",
+            "--chunk-size=1",
+            stdout=stdout,
+        )
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([row["title"] for row in rows], ["Post 1", "Post 2"])
+
+    def test_export_endpoint_streams_csv_to_staff(self):
+        url = reverse("export", args=["posts", "csv"])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual([row["title"] for row in rows], ["Post 0", "Post 1", "Post 2"])
+        self.assertEqual(rows[0]["user_id"], str(self.user.id))
+
+        response = self.client.get(reverse("export", args=["users", "csv"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_export_endpoint_streams_asynchronously_under_asgi(self):
+        await User.objects.filter(pk=self.user.pk).aupdate(is_staff=True)
+        token = AccessToken.for_user(self.user)
+        response = await AsyncClient().get(
+            reverse("export", args=["posts", "ndjson"]),
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        # A sync iterator would be read in full before the first byte is sent.
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row["title"] for row in rows], ["Post 0", "Post 1", "Post 2"])
+
+
+class ArchiveTests(APITestCase):
+    """Test archiving old posts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser1",
+            password="testpassword",
+            email="test_user1@mail.com",
+        )
+        self.old_post = Post.objects.create(
+            user=self.user, title="Old post", description="Long ago"
+        )
+        first = Comment.objects.create(
+            user=self.user, post=self.old_post, content="First"
+        )
+        Comment.objects.create(
+            user=self.user, post=self.old_post, parent=first, content="Reply"
+        )
+        Comment.objects.create(user=self.user, post=self.old_post, content="Second")
+        Post.objects.filter(pk=self.old_post.pk).update(
+            last_activity_at=timezone.now() - timedelta(days=400)
+        )
+        self.new_post = Post.objects.create(
+            user=self.user, title="New post", description="Today"
+        )
+        self.detail_url = reverse("posts:post-detail", args=[self.old_post.id])
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + str(refresh.access_token)
+        )
+
+    def test_archive_moves_old_posts_out_of_the_hot_tables(self):
+        response = self.client.get(self.detail_url + "?expand=comments")
+        expected = json.loads(response.content)
+
+        stdout = StringIO()
+        call_command("archive_posts", "--older-than-days=365", stdout=stdout)
+        self.assertIn("Archived 1 posts.", stdout.getvalue())
+        self.assertFalse(Post.objects.filter(pk=self.old_post.pk).exists())
+        self.assertFalse(Comment.objects.filter(post_id=self.old_post.pk).exists())
+        self.assertTrue(ArchivedPost.objects.filter(pk=self.old_post.pk).exists())
+
+        response = self.client.get(reverse("posts:post-list"))
+        self.assertEqual([post["title"] for post in response.data], ["New post"])
+
+        response = self.client.get(self.detail_url + "?expand=comments")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archived = json.loads(response.content)
+        # The archive keeps the comments in thread order.
+        self.assertEqual(
+            [comment["content"] for comment in archived["comments"]],
+            ["First", "Reply", "Second"],
+        )
+        for data in (archived, expected):
+            data["comments"].sort(key=lambda comment: comment["id"])
+        self.assertEqual(archived, expected)
+
+    def test_async_post_views(self):
+        response = self.client.get(
+            reverse("posts:async-post-detail", args=[self.new_post.id])
+        )
+        self.assertEqual(
+            response.content,
+            self.client.get(
+                reverse("posts:post-detail", args=[self.new_post.id])
+            ).content,
+        )
+        query = "?page_size=1&fields=id,title"
+        response = self.client.get(reverse("posts:async-post-list") + query)
+        self.assertEqual(
+            response.json()["results"],
+            self.client.get(reverse("posts:post-list") + query).json()["results"],
+        )
+        response = self.client.get(response.json()["next"])
+        self.assertEqual(
+            [post["title"] for post in response.json()["results"]], ["Old post"]
+        )
+
+        call_command("archive_posts", "--older-than-days=365", stdout=StringIO())
+        response = self.client.get(
+            reverse("posts:async-post-detail", args=[self.old_post.id])
+            + "?fields=id,title"
+        )
+        self.assertEqual(response.json(), {"id": self.old_post.id, "title": "Old post"})
+
+    def test_archived_post_detail_honors_fields_and_previews(self):
+        call_command("archive_posts", "--older-than-days=365", stdout=StringIO())
+
+        response = self.client.get(self.detail_url + "?fields=id,title")
+        self.assertEqual(response.data, {"id": self.old_post.id, "title": "Old post"})
+
+        response = self.client.get(
+            self.detail_url + "?fields=id,comments.content&expand=comments"
+        )
+        self.assertEqual(
+            response.data,
+            {
+                "id": self.old_post.id,
+                "comments": [
+                    {"content": "First"},
+                    {"content": "Reply"},
+                    {"content": "Second"},
+                ],
+            },
+        )
+
+        response = self.client.get(self.detail_url + "?comments=preview")
+        self.assertEqual(
+            [comment["content"] for comment in response.data["comments"]],
+            ["Second", "Reply", "First"],
+        )
+
+        response = self.client.delete(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
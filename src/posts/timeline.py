@@ -0,0 +1,245 @@
+"""
+Home timelines built from ``User.following``.
+
+New posts are copied into the timelines of their author's followers when they
+are created (fan-out on write). The fan-out runs after the creating transaction
+commits, in a background thread, and inserts timeline entries in batches.
+
+Authors with more than ``TIMELINE_FANOUT_THRESHOLD`` followers are not fanned
+out, since one of their posts would write a row per follower. Their newest
+posts are kept in a small per-author cache instead and merged into the
+timelines of their followers at read time (hybrid fan-out).
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from posts.models import Post, TimelineEntry
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = 1000
+BACKFILL_LIMIT = 500
+HIGH_FOLLOWER_TTL = 60 * 60
+RECENT_POSTS_TTL = 24 * 60 * 60
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="timeline-fanout")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def follower_ids(user_id):
+    """Return the ids of the users following ``user_id``."""
+    return User.following.through.objects.filter(to_user_id=user_id).values_list(
+        "from_user_id", flat=True
+    )
+
+
+def followed_ids(user_id):
+    """Return the ids of the users ``user_id`` follows."""
+    return User.following.through.objects.filter(from_user_id=user_id).values_list(
+        "to_user_id", flat=True
+    )
+
+
+def high_follower_ids():
+    """
+    Return the ids of the authors whose posts are merged at read time.
+
+    The set is computed with one aggregate over the follow table and cached, so
+    an author crossing the threshold is picked up within ``HIGH_FOLLOWER_TTL``.
+    """
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold is None:
+        return frozenset()
+
+    key = f"timeline:high-follower:{threshold}"
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = frozenset(
+            User.following.through.objects.values("to_user_id")
+            .annotate(followers=Count("id"))
+            .filter(followers__gt=threshold)
+            .values_list("to_user_id", flat=True)
+        )
+        cache.set(key, author_ids, HIGH_FOLLOWER_TTL)
+    return author_ids
+
+
+def recent_posts_key(author_id):
+    return f"timeline:recent:{author_id}"
+
+
+def load_recent_posts(author_id):
+    """Cache the newest ``(created_at, post_id)`` pairs of an author."""
+    posts = list(
+        Post.objects.filter(user_id=author_id)
+        .order_by("-created_at", "-id")
+        .values_list("created_at", "id")[: settings.TIMELINE_RECENT_POSTS]
+    )
+    cache.set(recent_posts_key(author_id), posts, RECENT_POSTS_TTL)
+    return posts
+
+
+def remember_recent_post(author_id, post_id, created_at):
+    """Add a new post to the recent posts cache of its author."""
+    posts = cache.get(recent_posts_key(author_id))
+    if posts is None:
+        # Loading from the database picks up the new post as well.
+        load_recent_posts(author_id)
+        return
+    posts = sorted({*posts, (created_at, post_id)}, reverse=True)
+    cache.set(
+        recent_posts_key(author_id),
+        posts[: settings.TIMELINE_RECENT_POSTS],
+        RECENT_POSTS_TTL,
+    )
+
+
+def fan_out_post(post_id):
+    """
+    Insert a post into the timelines of all followers of its author.
+
+    Posts of high-follower authors only go to the author's recent posts cache.
+    Returns the number of timeline rows written.
+    """
+    post = Post.objects.filter(pk=post_id).values("user_id", "created_at").first()
+    if post is None or post["user_id"] is None:
+        return 0
+
+    if post["user_id"] in high_follower_ids():
+        remember_recent_post(post["user_id"], post_id, post["created_at"])
+        return 0
+
+    written = 0
+    followers = follower_ids(post["user_id"]).order_by("from_user_id")
+    for batch in batched(
+        followers.iterator(chunk_size=FANOUT_BATCH_SIZE), FANOUT_BATCH_SIZE
+    ):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=follower_id,
+                    post_id=post_id,
+                    created_at=post["created_at"],
+                )
+                for follower_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+        written += len(batch)
+    return written
+
+
+def _fan_out_in_background(post_id):
+    try:
+        fan_out_post(post_id)
+    except Exception:
+        logger.exception("Fan-out of post %s failed", post_id)
+    finally:
+        # The worker thread has its own connection; don't leak it.
+        connection.close()
+
+
+def schedule_fan_out(post_id):
+    """Fan a new post out once the transaction creating it has committed."""
+    if settings.TIMELINE_FANOUT_ASYNC:
+        transaction.on_commit(lambda: _executor.submit(_fan_out_in_background, post_id))
+    else:
+        transaction.on_commit(lambda: fan_out_post(post_id))
+
+
+def merge_high_follower_posts(user_id, entries, position, limit):
+    """
+    Merge the posts of followed high-follower authors into a page of timeline
+    entries.
+
+    ``entries`` are the first ``limit`` materialized entries after
+    ``position``; the result is the first ``limit`` entries after ``position``
+    of both sources combined. The recent posts caches answer the first pages;
+    authors whose cache window is exhausted are read from the post table.
+    """
+    authors = high_follower_ids()
+    if authors:
+        authors = list(followed_ids(user_id).filter(to_user_id__in=authors))
+    if not authors:
+        return entries
+
+    size = settings.TIMELINE_RECENT_POSTS
+    cached = cache.get_many([recent_posts_key(author_id) for author_id in authors])
+    candidates = []
+    uncached = []
+    for author_id in authors:
+        posts = cached.get(recent_posts_key(author_id))
+        if posts is None:
+            posts = load_recent_posts(author_id)
+        # A full cache may not hold all the posts after the position.
+        window_full = len(posts) == size
+        if position is not None:
+            posts = [post for post in posts if post < tuple(position)]
+        if len(posts) < limit and window_full:
+            uncached.append(author_id)
+        else:
+            candidates.extend(posts[:limit])
+
+    if uncached:
+        posts = Post.objects.filter(user_id__in=uncached)
+        if position is not None:
+            created_at, post_id = position
+            posts = posts.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id)
+            )
+        candidates.extend(
+            posts.order_by("-created_at", "-id").values_list("created_at", "id")[:limit]
+        )
+
+    seen = {entry.post_id for entry in entries}
+    merged = entries + [
+        TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at)
+        for created_at, post_id in candidates
+        if post_id not in seen
+    ]
+    merged.sort(key=lambda entry: (entry.created_at, entry.post_id), reverse=True)
+    return merged[:limit]
+
+
+def backfill_timeline(user_id, limit=BACKFILL_LIMIT):
+    """
+    Add the ``limit`` newest posts of the users ``user_id`` follows to their
+    timeline. Entries that already exist are left alone, and high-follower
+    authors are skipped since their posts are merged at read time.
+
+    Returns the number of posts considered.
+    """
+    posts = (
+        Post.objects.filter(user_id__in=followed_ids(user_id))
+        .exclude(user_id__in=high_follower_ids())
+        .order_by("-created_at", "-id")
+        .values_list("id", "created_at")[:limit]
+    )
+    entries = [
+        TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at)
+        for post_id, created_at in posts
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def rebuild_timeline(user_id, limit=BACKFILL_LIMIT):
+    """Drop the timeline of ``user_id`` and build it again from scratch."""
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        return backfill_timeline(user_id, limit=limit)
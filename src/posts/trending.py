@@ -0,0 +1,92 @@
+"""
+Trending scores of posts.
+
+The score of a post is ``log10(engagement) + created_at / TRENDING_DECAY``,
+where engagement is one plus its comments plus the upvotes of its comments.
+Ten times the engagement is worth a post ``TRENDING_DECAY`` seconds newer.
+Since the age enters through the creation time rather than "now", scores
+never go stale on their own: only posts with new comments or votes need to be
+rescored, and the trending list is a plain scan of the score index.
+"""
+
+import math
+
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from posts.models import Comment, CommentVote, Post, PostScore
+
+TRENDING_DECAY = 45000
+
+
+def trending_score(created_at, engagement):
+    return math.log10(max(engagement, 1)) + created_at.timestamp() / TRENDING_DECAY
+
+
+def refresh_trending_scores(full=False, batch_size=1000):
+    """
+    Rescore the posts whose engagement may have changed since the last
+    refresh, or all posts with ``full``. Returns the number of posts scored.
+
+    Removed comments touch ``Post.updated_at`` and withdrawn votes
+    ``Comment.updated_at``, so lower scores are picked up as well as higher
+    ones. Deleted posts take their scores with them.
+    """
+    started_at = timezone.now()
+    posts = Post.objects.all()
+    last_refresh = PostScore.objects.order_by("-computed_at").first()
+    if not full and last_refresh is not None:
+        since = last_refresh.computed_at
+        # One index range scan per source; ORed together, the subqueries
+        # would be checked against every post instead.
+        changed = (
+            Post.objects.filter(last_activity_at__gte=since)
+            .values("id")
+            .union(
+                Post.objects.filter(updated_at__gte=since).values("id"),
+                Comment.objects.filter(updated_at__gte=since).values("post_id"),
+                CommentVote.objects.filter(created_at__gte=since).values(
+                    "comment__post_id"
+                ),
+            )
+        )
+        posts = posts.filter(id__in=changed)
+
+    upvotes = (
+        Comment.objects.filter(post=OuterRef("pk"))
+        .values("post")
+        .annotate(total=Sum("upvotes"))
+        .values("total")
+    )
+    posts = posts.annotate(
+        upvotes=Coalesce(Subquery(upvotes, output_field=IntegerField()), 0)
+    ).values_list("id", "created_at", "comment_count", "upvotes")
+
+    scored = 0
+    batch = []
+    for post_id, created_at, comment_count, upvotes in posts.iterator(
+        chunk_size=batch_size
+    ):
+        engagement = 1 + comment_count + upvotes
+        batch.append(
+            PostScore(
+                post_id=post_id,
+                score=trending_score(created_at, engagement),
+                computed_at=started_at,
+            )
+        )
+        if len(batch) == batch_size:
+            scored += _save_scores(batch)
+            batch = []
+    return scored + _save_scores(batch)
+
+
+def _save_scores(scores):
+    PostScore.objects.bulk_create(
+        scores,
+        update_conflicts=True,
+        unique_fields=["post"],
+        update_fields=["score", "computed_at"],
+    )
+    return len(scores)
@@ -1,14 +1,56 @@
 from django.urls import path
-from posts.views import PostList, PostDetail, CommentList, CommentDetail
+from posts.async_views import AsyncPostDetail, AsyncPostList
+from posts.views import (
+    PostList,
+    PostBulkCreate,
+    PostDetail,
+    PostCacheStats,
+    PostSearch,
+    CommentList,
+    CommentBulkCreate,
+    CommentDetail,
+    CommentReplies,
+    CommentThread,
+    CommentVoteView,
+    TimelineList,
+    TrendingList,
+)
 
 app_name = "posts"
 urlpatterns = [
     path("", PostList.as_view(), name="post-list"),
+    path("bulk/", PostBulkCreate.as_view(), name="post-bulk-create"),
+    path("cache-stats/", PostCacheStats.as_view(), name="post-cache-stats"),
+    path("search/", PostSearch.as_view(), name="post-search"),
+    path("timeline/", TimelineList.as_view(), name="timeline"),
+    path("trending/", TrendingList.as_view(), name="trending"),
     path("<int:pk>/", PostDetail.as_view(), name="post-detail"),
     path("<int:post_id>/comments/", CommentList.as_view(), name="comment-list"),
+    path(
+        "<int:post_id>/comments/bulk/",
+        CommentBulkCreate.as_view(),
+        name="comment-bulk-create",
+    ),
     path(
         "<int:post_id>/comments/<int:pk>/",
         CommentDetail.as_view(),
         name="comment-detail",
     ),
+    path(
+        "<int:post_id>/comments/<int:pk>/thread/",
+        CommentThread.as_view(),
+        name="comment-thread",
+    ),
+    path(
+        "<int:post_id>/comments/<int:pk>/replies/",
+        CommentReplies.as_view(),
+        name="comment-replies",
+    ),
+    path(
+        "<int:post_id>/comments/<int:pk>/vote/",
+        CommentVoteView.as_view(),
+        name="comment-vote",
+    ),
+    path("async/", AsyncPostList.as_view(), name="async-post-list"),
+    path("async/<int:pk>/", AsyncPostDetail.as_view(), name="async-post-detail"),
 ]
@@ -1,25 +1,212 @@
-from posts.models import Post, Comment
+from posts.models import (
+    ArchivedPost,
+    Comment,
+    CommentVote,
+    Post,
+    PostScore,
+    TimelineEntry,
+)
 from rest_framework import generics
-from posts.serializers import PostSerializer, CommentSerializer
+from posts.serializers import PostSerializer, PostPreviewSerializer, CommentSerializer
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import (
+    Count,
+    F,
+    FloatField,
+    Max,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from posts.permissions import IsOwnerOrReadOnly
+from posts.activity import comment_added
+from posts.archive import archived_representation
+from posts.conditional import ConditionalGetMixin
+from posts.timeline import schedule_fan_out
+from posts.cache import (
+    CachedResponseMixin,
+    LIST_VERSION_KEY,
+    cache_stats,
+    get_version,
+    invalidate_post,
+    invalidate_posts,
+    post_version_key,
+)
+from rest_framework.permissions import IsAdminUser
+from config.fastpath import FastListMixin
+from config.serializers import select_fields
+from posts.pagination import (
+    PostPagination,
+    ReplyPagination,
+    ThreadPagination,
+    SearchPagination,
+    TimelinePagination,
+    TrendingPagination,
+)
 
 
-class PostList(generics.ListCreateAPIView):
-    """This class handles listing and creating posts in our REST API."""
+def get_max_depth(request):
+    """Read the optional ``?max_depth=`` of a comment listing."""
+    value = request.query_params.get("max_depth")
+    if value is None:
+        return None
+    try:
+        max_depth = int(value)
+    except ValueError:
+        max_depth = -1
+    if max_depth < 0:
+        raise ValidationError({"max_depth": "A non-negative integer is required."})
+    return max_depth
+
+
+class CommentPreviewMixin:
+    """Serve posts with bounded comment previews when asked to.
+
+    With ``?comments=preview`` each post carries only its newest comments
+    next to its ``comment_count``. The previews of all posts are fetched in a single
+    query (a ROW_NUMBER() window partitioned by post), instead of loading the
+    full comment list of every post. The full list stays on CommentList.
+    """
+
+    comment_preview_size = 3
+
+    def wants_comment_preview(self):
+        return (
+            self.request.method == "GET"
+            and self.request.query_params.get("comments") == "preview"
+        )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.wants_comment_preview():
+            return queryset
+
+        newest_comments = Comment.objects.select_related("user").order_by(
+            "-created_at", "-id"
+        )
+        return queryset.select_related("user").prefetch_related(
+            Prefetch(
+                "comments",
+                queryset=newest_comments[: self.comment_preview_size],
+                to_attr="preview_comments",
+            )
+        )
+
+    def get_serializer_class(self):
+        if self.wants_comment_preview():
+            return PostPreviewSerializer
+        return super().get_serializer_class()
+
+
+class PostList(
+    CachedResponseMixin,
+    CommentPreviewMixin,
+    FastListMixin,
+    generics.ListCreateAPIView,
+):
+    """This class handles listing and creating posts in our REST API.
+
+    Posts are paginated newest first when the client asks for it with
+    ``?page_size=<n>``; follow the ``next`` link to get the following page.
+    Add ``?comments=preview`` to embed only the newest comments of each post,
+    and ``?ordering=active`` to list the most recently commented posts first.
+    """
 
     queryset = Post.objects.all()
     serializer_class = PostSerializer
+    pagination_class = PostPagination
+    orderings = {"active": ("-last_activity_at", "-id")}
+
+    def get_cache_version(self):
+        return get_version(LIST_VERSION_KEY)
+
+    def get_keyset_ordering(self):
+        return self.orderings.get(self.request.query_params.get("ordering"))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        ordering = self.get_keyset_ordering()
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        if self.request.method == "GET":
+            queryset = select_fields(
+                queryset, self.get_serializer(), extra=self.get_row_columns()
+            )
+        return queryset
+
+    def get_row_columns(self):
+        # The paginator reads the ordering columns of the last row.
+        ordering = self.get_keyset_ordering() or self.pagination_class.ordering
+        return [name.lstrip("-") for name in ordering]
 
     def perform_create(self, serializer):
         # Set the user field to the current user
         serializer.save(user=self.request.user)
 
 
-class PostDetail(generics.RetrieveUpdateDestroyAPIView):
+class BulkCreateMixin:
+    """
+    Create a JSON array of objects in one request.
+
+    The whole array is validated first; any invalid item fails the request with
+    a list of per-item errors. Valid arrays are inserted with ``bulk_create``
+    in a single transaction and returned in order.
+    """
+
+    max_batch_size = 500
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=self.max_batch_size,
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class PostBulkCreate(BulkCreateMixin, generics.CreateAPIView):
+    """This class handles creating many posts at once in our REST API."""
+
+    queryset = Post.objects.all()
+    serializer_class = PostSerializer
+
+    def perform_create(self, serializer):
+        posts = serializer.save(user=self.request.user)
+        # Do what the post_save handlers do for posts created one at a time.
+        for post in posts:
+            schedule_fan_out(post.pk)
+        invalidate_posts([post.pk for post in posts])
+        if "comments" in serializer.child.fields:
+            # Serialize the (empty) comments of all posts with one query.
+            prefetch_related_objects(posts, "comments")
+
+
+class PostDetail(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    CommentPreviewMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     """This class handles operations for a single post instance.
 
-    - GET: Retrieve the details of a specific post.
+    - GET: Retrieve the details of a specific post. Supports conditional
+      requests with ``If-None-Match`` and ``If-Modified-Since``. Archived
+      posts are served read-only from the archive.
     - PUT: Update the entire post instance.
     - PATCH: Partially update the post instance.
     - DELETE: Remove the specific post instance.
@@ -30,20 +217,166 @@ class PostDetail(generics.RetrieveUpdateDestroyAPIView):
     # Only the author can update or delete the post.
     permission_classes = [IsOwnerOrReadOnly]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == "GET":
+            queryset = select_fields(queryset, self.get_serializer())
+        return queryset
+
+    def get_cache_version(self):
+        return get_version(post_version_key(self.kwargs["pk"]))
+
+    def get_version(self):
+        # Adding or removing comments touches the post itself; edits and
+        # votes only touch the comment.
+        version = (
+            Post.objects.filter(pk=self.kwargs["pk"])
+            .annotate(comments_updated_at=Max("comments__updated_at"))
+            .values_list("updated_at", "comments_updated_at")
+            .first()
+        )
+        if version is None:
+            return None
+        return max(filter(None, version)), version
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Posts without recent activity move to the archive (see
+            # posts.archive); they are only looked up once the hot table misses.
+            archived = ArchivedPost.objects.filter(pk=self.kwargs["pk"]).first()
+            if archived is None:
+                raise
+        preview_size = (
+            self.comment_preview_size if self.wants_comment_preview() else None
+        )
+        return Response(
+            archived_representation(archived, self.get_serializer(), preview_size)
+        )
+
 
-class CommentList(generics.ListCreateAPIView):
-    """This class handles listing and creating comments for a specific post in our REST API."""
+class CommentList(ConditionalGetMixin, FastListMixin, generics.ListCreateAPIView):
+    """This class handles listing and creating comments for a specific post in our REST API.
+
+    Comments are listed in thread order, every reply right after its parent.
+    ``?max_depth=<n>`` leaves out replies nested deeper than ``n`` (``0``
+    lists top-level comments only), and ``?page_size=<n>`` paginates.
+    Listing supports conditional requests with ``If-None-Match`` and
+    ``If-Modified-Since``.
+    """
 
     serializer_class = CommentSerializer
+    pagination_class = ThreadPagination
 
     def get_queryset(self):
         post_id = self.kwargs["post_id"]
-        return Comment.objects.filter(post_id=post_id)
+        queryset = Comment.objects.filter(post_id=post_id).order_by("path")
+        if self.request.method == "GET":
+            max_depth = get_max_depth(self.request)
+            if max_depth is not None:
+                queryset = queryset.filter(depth__lte=max_depth)
+            queryset = select_fields(
+                queryset, self.get_serializer(), extra=self.get_row_columns()
+            )
+        return queryset
+
+    def get_row_columns(self):
+        return ["path"]
+
+    def get_version(self):
+        version = Comment.objects.filter(post_id=self.kwargs["post_id"]).aggregate(
+            count=Count("id"), updated_at=Max("updated_at")
+        )
+        return version["updated_at"], (version["count"], version["updated_at"])
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == "POST":
+            # Comments go to the post of the URL, whatever the body says.
+            context["post"] = get_object_or_404(Post, id=self.kwargs["post_id"])
+        return context
 
     def perform_create(self, serializer):
-        post_id = self.kwargs["post_id"]
-        post = get_object_or_404(Post, id=post_id)
-        serializer.save(user=self.request.user, post=post)
+        serializer.save(user=self.request.user)
+
+
+class CommentBulkCreate(BulkCreateMixin, generics.CreateAPIView):
+    """This class handles creating many comments on a post at once in our REST API.
+
+    All comments go to the post of the URL, which is looked up once; items
+    leave out ``post``.
+    """
+
+    serializer_class = CommentSerializer
+
+    def get_queryset(self):
+        return Comment.objects.filter(post_id=self.kwargs["post_id"])
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["post"] = get_object_or_404(Post, id=self.kwargs["post_id"])
+        return context
+
+    def perform_create(self, serializer):
+        post = serializer.context["post"]
+        comments = serializer.save(user=self.request.user, post=post)
+        # Do what the post_save handlers do for comments created one at a time.
+        comment_added(
+            post.pk, max(comment.created_at for comment in comments), len(comments)
+        )
+        invalidate_post(post.pk)
+
+
+class CommentTreeMixin:
+    """Look up the comment a thread or reply listing starts from."""
+
+    serializer_class = CommentSerializer
+
+    def get_root(self):
+        return get_object_or_404(
+            Comment.objects.only("post_id", "path", "depth"),
+            post_id=self.kwargs["post_id"],
+            pk=self.kwargs["pk"],
+        )
+
+    def get_row_columns(self):
+        return ["path"]
+
+
+class CommentThread(CommentTreeMixin, FastListMixin, generics.ListAPIView):
+    """This class lists a comment and all its replies in thread order.
+
+    ``?max_depth=<n>`` stops ``n`` levels below the comment. The subtree is
+    read with a single range scan of the (post, path) index; paginate with
+    ``?page_size=<n>``.
+    """
+
+    pagination_class = ThreadPagination
+
+    def get_queryset(self):
+        comments = Comment.objects.subtree(
+            self.get_root(), max_depth=get_max_depth(self.request)
+        )
+        return select_fields(
+            comments, self.get_serializer(), extra=self.get_row_columns()
+        )
+
+
+class CommentReplies(CommentTreeMixin, FastListMixin, generics.ListAPIView):
+    """This class lists the direct replies to a comment, oldest first.
+
+    Replies are always paginated; list deeper levels through the replies of
+    each reply.
+    """
+
+    pagination_class = ReplyPagination
+
+    def get_queryset(self):
+        comments = Comment.objects.replies(self.get_root())
+        return select_fields(
+            comments, self.get_serializer(), extra=self.get_row_columns()
+        )
 
 
 class CommentDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -58,3 +391,162 @@ class CommentDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CommentSerializer
     # Only the author can update or delete the comment.
     permission_classes = [IsOwnerOrReadOnly]
+
+
+class CommentVoteView(APIView):
+    """This class handles upvoting a comment.
+
+    - POST: Upvote the comment. Voting again has no further effect.
+    - DELETE: Withdraw the upvote.
+
+    Votes are unique per user and comment. The counter on the comment is
+    adjusted with an atomic ``upvotes = upvotes +/- 1`` in the same
+    transaction, so concurrent votes neither get lost nor double counted.
+    """
+
+    def get_comment_id(self, post_id, pk):
+        comment = get_object_or_404(Comment.objects.only("id"), pk=pk, post_id=post_id)
+        return comment.id
+
+    def vote_response(self, comment_id, voted, status_code=status.HTTP_200_OK):
+        upvotes = Comment.objects.values_list("upvotes", flat=True).get(pk=comment_id)
+        return Response({"upvotes": upvotes, "voted": voted}, status=status_code)
+
+    def post(self, request, post_id, pk):
+        comment_id = self.get_comment_id(post_id, pk)
+        with transaction.atomic():
+            _, created = CommentVote.objects.get_or_create(
+                user=request.user, comment_id=comment_id
+            )
+            if created:
+                Comment.objects.filter(pk=comment_id).update(
+                    upvotes=F("upvotes") + 1, updated_at=timezone.now()
+                )
+                invalidate_post(post_id)
+
+        if created:
+            return self.vote_response(comment_id, True, status.HTTP_201_CREATED)
+        return self.vote_response(comment_id, True)
+
+    def delete(self, request, post_id, pk):
+        comment_id = self.get_comment_id(post_id, pk)
+        with transaction.atomic():
+            deleted, _ = CommentVote.objects.filter(
+                user=request.user, comment_id=comment_id
+            ).delete()
+            if deleted:
+                Comment.objects.filter(pk=comment_id).update(
+                    upvotes=F("upvotes") - 1, updated_at=timezone.now()
+                )
+                invalidate_post(post_id)
+        return self.vote_response(comment_id, False)
+
+
+class PostCacheStats(APIView):
+    """This class reports the hit and miss counters of the post response cache."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class TimelineList(generics.ListAPIView):
+    """This class lists the home timeline of the current user.
+
+    The timeline holds the posts of the users the current user follows,
+    newest first. It is always paginated; follow the ``next`` link.
+    """
+
+    serializer_class = PostSerializer
+    pagination_class = TimelinePagination
+
+    def get_queryset(self):
+        return TimelineEntry.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        entries = self.paginate_queryset(self.get_queryset())
+        # Entries merged in at read time are not backed by rows, so the posts
+        # of the page are loaded separately, in one query.
+        posts = select_fields(Post.objects.all(), self.get_serializer()).in_bulk(
+            [entry.post_id for entry in entries]
+        )
+        serializer = self.get_serializer(
+            [posts[entry.post_id] for entry in entries if entry.post_id in posts],
+            many=True,
+        )
+        return self.get_paginated_response(serializer.data)
+
+
+class TrendingList(generics.ListAPIView):
+    """This class lists trending posts, highest score first.
+
+    Scores are precomputed by the refresh_trending_scores command, so a page
+    is a single scan of the score index. The list is always paginated.
+    """
+
+    serializer_class = PostSerializer
+    pagination_class = TrendingPagination
+
+    def get_queryset(self):
+        return select_fields(
+            PostScore.objects.all(),
+            self.get_serializer(),
+            prefix="post",
+            extra=["score"],
+        )
+
+    def list(self, request, *args, **kwargs):
+        scores = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer([score.post for score in scores], many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class PostSearch(generics.ListAPIView):
+    """This class handles full-text search over posts and their comments.
+
+    - GET ``?q=<terms>``: Posts whose title, description or comments match,
+      best match first. ``q`` accepts web search syntax (quotes, ``or``, ``-``).
+    - ``?lang=en`` or ``?lang=de`` restricts stemming to one language; by
+      default both are tried. Results are always paginated.
+    """
+
+    serializer_class = PostSerializer
+    pagination_class = SearchPagination
+    search_configs = {"en": ["english"], "de": ["german"]}
+
+    def get_search_query(self):
+        terms = self.request.query_params.get("q", "").strip()
+        if not terms:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        lang = self.request.query_params.get("lang")
+        configs = self.search_configs.get(lang, ["english", "german"])
+        query = SearchQuery(terms, config=configs[0], search_type="websearch")
+        for config in configs[1:]:
+            query |= SearchQuery(terms, config=config, search_type="websearch")
+        return query
+
+    def get_queryset(self):
+        query = self.get_search_query()
+        matching_comments = Comment.objects.filter(search_vector=query)
+        best_comment_rank = (
+            matching_comments.filter(post=OuterRef("pk"))
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank")
+            .values("rank")[:1]
+        )
+        posts = Post.objects.filter(
+            Q(search_vector=query) | Q(id__in=matching_comments.values("post_id"))
+        ).annotate(
+            # ts_rank() returns a real, which does not survive the round
+            # trip through the cursor exactly; double precision does.
+            rank=Cast(
+                Greatest(
+                    SearchRank(F("search_vector"), query),
+                    Coalesce(Subquery(best_comment_rank), 0.0),
+                ),
+                FloatField(),
+            )
+        )
+        return select_fields(posts, self.get_serializer())
@@ -1,6 +1,7 @@
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 from rest_framework import serializers
+from config.serializers import FlexFieldsMixin
 
 
 from users.models import User, Address
@@ -98,7 +99,7 @@ class AddressSerializer(serializers.ModelSerializer):
         fields = ["city", "postal_code"]
 
 
-class UserInfoSerializer(serializers.ModelSerializer):
+class UserInfoSerializer(FlexFieldsMixin, serializers.ModelSerializer):
     address = AddressSerializer()
 
     class Meta:
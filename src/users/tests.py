@@ -312,6 +312,29 @@ class TestUserInfo(TestCase):
             {"city": "New York", "postal_code": "12345"},
         )
 
+    def test_user_info_sparse_fields(self):
+        login = self.client.post(
+            self.login_url,
+            {
+                "username": "test_user",
+                "password": "test_user_password",
+            },
+        )
+
+        access = login.data.get("access")
+
+        response = self.client.get(
+            self.user_url + "?fields=username,address",
+            headers={"Authorization": f"Bearer {access}"},
+        )
+        self.assertEqual(
+            response.data,
+            {
+                "username": "test_user",
+                "address": {"city": "New York", "postal_code": "12345"},
+            },
+        )
+
     def test_user_delete(self):
         login = self.client.post(
             self.login_url,
@@ -3,6 +3,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.http import Http404
+from django.shortcuts import get_object_or_404
 from users.models import User
 
 from django.core.mail import EmailMessage
@@ -11,6 +12,7 @@ from users.tokens import account_activation_token
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.conf import settings
+from config.serializers import select_fields
 
 
 from users.serializers import (
@@ -99,9 +101,12 @@ class UserView(APIView):
             return Http404
 
     def get(self, request, format=None):
-        user = self.get_user(request=request)
+        context = {"request": request}
+        # Only load the columns of the fields asked for with ?fields=.
+        users = select_fields(User.objects.all(), UserInfoSerializer(context=context))
+        user = get_object_or_404(users, pk=request.user.id)
 
-        serializer = UserInfoSerializer(user)
+        serializer = UserInfoSerializer(user, context=context)
 
         return Response(serializer.data)
 